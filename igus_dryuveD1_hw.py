@@ -1,15 +1,41 @@
 from ScopeFoundry import HardwareComponent
-from ScopeFoundryHW.igus_dryve.igus_dryveD1 import IgusDryveD1
+from ScopeFoundryHW.igus_dryve.igus_dryveD1 import IgusDryveD1, OBJECT_DICTIONARY
+from ScopeFoundryHW.igus_dryve.igus_dryveD1_motion import AxisWorker
+from ScopeFoundryHW.igus_dryve.igus_dryveD1_units import DryveUnits
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 import time
 
 class IgusDryveD1MotorHW(HardwareComponent):
     
     name = 'igus_d1'
+
+    # setting --> OBJECT_DICTIONARY entry, connected on connect() and read
+    # back in one request. Settings not created in setup() are created
+    # from the object dictionary
+    OD_SETTINGS = [
+        ('position', 'actual_position'),
+        ('velocity', 'actual_velocity'),
+        ('target_pos', 'target_position'),
+        ('profile_velocity', 'profile_velocity'),
+        ('profile_acc', 'profile_acc'),
+        ('home_velocity', 'home_velocity'),
+        ('home_velocity2', 'home_velocity2'),
+        ('home_acc', 'home_acc'),
+        ('homing_method', 'homing_method'),
+        ('feed_constant', 'feed_constant'),
+        ('feed_revs', 'feed_revs'),
+        ('operating_mode', 'mode_display'),
+        ]
+
+    # controller position units --> setting units
+    UNIT_LABELS = {'pu': 'um', 'pu/s': 'um/s', 'pu/s2': 'um/s2'}
     
     def setup(self):
         
         self.settings.New('ip_address', dtype=str, initial='192.168.0.10')
         self.settings.New('initialize_on_connect', dtype=bool, initial=True)
+        # only do the enable steps that have not happened yet, see IgusDryveD1.initialize
+        self.settings.New('fast_connect', dtype=bool, initial=True)
         self.settings.New('go_on_new_target', dtype=bool, initial=True)
         
         self.settings.New('position', dtype=int, ro=True, unit='um')
@@ -29,6 +55,19 @@ class IgusDryveD1MotorHW(HardwareComponent):
 
         self.settings.New('operating_mode', dtype=int, ro=True)
 
+        existing = self.settings.as_dict()
+        for setting, od_name in self.OD_SETTINGS:
+            if setting not in existing:
+                obj = OBJECT_DICTIONARY[od_name]
+                self.settings.New(setting, dtype=int, ro=(obj.access == 'ro'),
+                                  unit=self.UNIT_LABELS.get(obj.unit))
+
+        ## Units, see DryveUnits. lead = 0: controller position units are um
+        self.settings.New('lead', dtype=float, initial=0.0, unit='um/rev')
+        self.settings.New('soft_limits_enable', dtype=bool, initial=False)
+        self.settings.New('soft_limit_min', dtype=int, initial=0, unit='um')
+        self.settings.New('soft_limit_max', dtype=int, initial=300000, unit='um')
+
         ## Status flags
         self.settings.New('ready_to_sw_on', dtype=bool, ro=True)
         self.settings.New('switched_on', dtype=bool, ro=True)
@@ -41,100 +80,395 @@ class IgusDryveD1MotorHW(HardwareComponent):
         self.settings.New('remote_enable', dtype=bool, ro=True)
         self.settings.New('target_reached', dtype=bool, ro=True)
         self.settings.New('internal_limit_active', dtype=bool, ro=True)
+        # last failed status poll, empty while polling works
+        self.settings.New('poll_error', dtype=str, ro=True, initial='')
+
+        ## Telemetry, while recording threaded_update uses its samples
+        self.settings.New('telemetry_enable', dtype=bool, initial=False)
+        self.settings.New('telemetry_rate', dtype=float, initial=100.0, unit='Hz')
+        self.settings.New('telemetry_capacity', dtype=int, initial=100000)
+
+        ## Position triggers, see add_position_threshold
+        self.settings.New('trigger_rate', dtype=float, initial=500.0, unit='Hz')
+
+        ## Driver metrics (see DryveMetrics), refreshed every metrics_interval
+        self.settings.New('metrics_interval', dtype=float, initial=1.0, unit='s')
+        self.settings.New('metrics_requests', dtype=int, ro=True)
+        self.settings.New('metrics_errors', dtype=int, ro=True)
+        self.settings.New('metrics_latency_mean', dtype=float, ro=True, unit='ms')
+        self.settings.New('metrics_latency_p99', dtype=float, ro=True, unit='ms')
+        self.settings.New('metrics_latency_max', dtype=float, ro=True, unit='ms')
+        self.settings.New('metrics_lock_wait_max', dtype=float, ro=True, unit='ms')
+        self.settings.New('metrics_wait_time', dtype=float, ro=True, unit='s')
+        self.settings.New('metrics_wait_timeouts', dtype=int, ro=True)
         
         self.add_operation('Halt', self.halt)
         self.add_operation('Start Home', self.start_home)
+        self.add_operation('Reset Metrics', self.reset_metrics)
+
+        self._last_status_word = None
+        self._last_metrics_update = 0.0
+        self.telemetry = None
+        self.state = None
+        self._state_version = 0
+        self.worker = None
+        self.units = None
+        self._target_future = None
 
 
 
     def connect(self):
         S = self.settings
-        self.d1 = IgusDryveD1(ip_address=S['ip_address'], port=502, 
-                              initialize=S['initialize_on_connect'], 
-                              debug=S['debug_mode'])
-        
-        S.position.connect_to_hardware(
-            read_func=self.d1.read_actual_position)
-        
-        S.target_pos.connect_to_hardware(
-            read_func=self.d1.read_target_position,
-            write_func=self.on_new_target)
+        self._last_status_word = None
+        self.telemetry = None
+        # shared with other components / scripts using the same controller,
+        # reconnects by itself if the link drops
+        self.d1 = IgusDryveD1.shared(ip_address=S['ip_address'], port=502, 
+                                     initialize=S['initialize_on_connect'], 
+                                     fast_initialize=S['fast_connect'],
+                                     debug=S['debug_mode'])
+        # shared by everything using this controller, see StatePublisher
+        self.state = self.d1.state_publisher()
+        self._state_version = 0
+        self.worker = AxisWorker(self.d1, name=self.name)
+        self._target_future = None
+        self.units = DryveUnits(self.d1)
+        self.update_units()
         
-        S.profile_velocity.connect_to_hardware(
-            read_func=self.d1.read_profile_velocity,
-            write_func=self.d1.write_profile_velocity)
-
-        S.profile_acc.connect_to_hardware(
-            read_func=self.d1.read_profile_acc,
-            write_func=self.d1.write_profile_acc)
+        # object dictionary settings, positions, velocities and accelerations
+        # go through the units layer
+        for setting, od_name in self.OD_SETTINGS:
+            obj = OBJECT_DICTIONARY[od_name]
+            read_func = getattr(self.d1, f"read_{obj.name}")
+            write_func = None
+            if obj.access != 'ro':
+                write_func = getattr(self.d1, f"write_{obj.name}")
+            if obj.unit is not None:
+                read_func = self._phys_reader(read_func)
+                if write_func is not None:
+                    write_func = self._raw_writer(write_func, obj.unit)
+            if setting == 'target_pos':
+                write_func = self.on_new_target
+            S.get_lq(setting).connect_to_hardware(read_func=read_func, write_func=write_func)
         
-        S.home_velocity.connect_to_hardware(
-            read_func=self.d1.read_home_velocity,
-            write_func=self.d1.write_home_velocity)
-
-        S.home_velocity2.connect_to_hardware(
-            read_func=self.d1.read_home_velocity2,
-            write_func=self.d1.write_home_velocity2)
-
-        S.home_acc.connect_to_hardware(
-            read_func=self.d1.read_home_acc,
-            write_func=self.d1.write_home_acc)
+        for name in ('lead', 'soft_limits_enable', 'soft_limit_min', 'soft_limit_max'):
+            S.get_lq(name).connect_to_hardware(write_func=self.update_units)
         
-        S.feed_constant.connect_to_hardware(
-            read_func=self.d1.read_feed_constant,
-            write_func=self.d1.write_feed_constant)
+        S.telemetry_enable.connect_to_hardware(
+            write_func=self.set_telemetry_enable)
         
-        S.feed_revs.connect_to_hardware(
-            read_func=self.d1.read_feed_revs,
-            write_func=self.d1.write_feed_revs)
+        S.telemetry_rate.connect_to_hardware(
+            write_func=self.set_telemetry_rate)
         
-        S.operating_mode.connect_to_hardware(
-            read_func=self.d1.read_mode)
+        S.trigger_rate.connect_to_hardware(
+            write_func=lambda rate: self.d1.position_monitor(rate=rate))
         
-        self.read_from_hardware()
+        self.read_from_hardware_batched()
 
+    # settings read back on connect: setting --> ODObject
+    READBACK = [(setting, OBJECT_DICTIONARY[od_name]) for setting, od_name in OD_SETTINGS]
+
+    # settings in um, um/s, um/s2: converted by the units layer
+    PHYSICAL_SETTINGS = {setting for setting, od_name in OD_SETTINGS
+                         if OBJECT_DICTIONARY[od_name].unit is not None}
+
+    def update_units(self, *args):
+        S = self.settings
+        self.units.lead = S['lead'] or None
+        if S['soft_limits_enable']:
+            self.units.soft_limits = (S['soft_limit_min'], S['soft_limit_max'])
+        else:
+            self.units.soft_limits = (None, None)
+
+    def _phys(self, raw):
+        "controller units --> (rounded) setting units"
+        return int(round(self.units.from_raw(raw)))
+
+    def _phys_reader(self, read_func):
+        return lambda: self._phys(read_func())
+
+    def _raw_writer(self, write_func, unit):
+        if unit == 'pu':
+            return lambda x: write_func(self.units.position_to_raw(x))
+        return lambda x: write_func(self.units.velocity_to_raw(x))
+
+    def read_from_hardware_batched(self):
+        """
+        Like read_from_hardware(), but the READBACK settings and the
+        statusword are read in a single pipelined request
+        """
+        S = self.settings
+        values = self.d1.ask_many([dict(sdo_obj=o.index, sub_index=o.sub, datatype=o.datatype)
+                                   for name, o in self.READBACK]
+                                  + [dict(sdo_obj=0x6041, sub_index=0, datatype='H')])
+        for (name, o), value in zip(self.READBACK, values):
+            if name in self.PHYSICAL_SETTINGS:
+                value = self._phys(value)
+            S.get_lq(name).update_value(value, update_hardware=False)
+        self._last_status_word = None
+        self.update_status_settings(values[-1])
+
+
+    @staticmethod
+    def connect_parallel(hardware_components, max_workers=None):
+        """
+        Connect several hardware components (eg all axes of a rack) at the
+        same time instead of one after the other. Returns a dict
+        name --> exception for those that failed.
+        """
+        def connect_one(hw):
+            hw.settings['connected'] = True
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max_workers or len(hardware_components) or 1) as pool:
+            futures = {hw.name: pool.submit(connect_one, hw) for hw in hardware_components}
+        for name, fut in futures.items():
+            if fut.exception() is not None:
+                errors[name] = fut.exception()
+        return errors
 
     def on_new_target(self, pos):
-        self.d1.write_target_position(pos)
         if self.settings['go_on_new_target']:
-            self.d1.write_mode_and_wait(1, timeout=0.2)
-            self.d1.trigger_move()
+            # don't block the settings write path, a new target replaces
+            # a move that is still going
+            if self._target_future is not None:
+                self._target_future.cancel()
+            self._target_future = self.move_to_async(pos)
+        else:
+            self.d1.write_target_position(self.units.position_to_raw(pos))
+
+    def move_to_async(self, pos, speed=None, acc=None, timeout=10.0):
+        """
+        Absolute move on the axis worker thread, returns a
+        concurrent.futures.Future (result: final status). cancel() halts
+        the axis. pos, speed and acc are in um, um/s, um/s2, speed and acc
+        default to the profile_velocity and profile_acc settings. A target
+        outside the soft limits raises ValueError before anything is sent.
+        """
+        S = self.settings
+        if speed is None:
+            speed = S['profile_velocity']
+        if acc is None:
+            acc = S['profile_acc']
+        u = self.units
+        fut = self.worker.move_to(u.position_to_raw(pos), u.velocity_to_raw(speed),
+                                  u.acc_to_raw(acc), timeout=timeout)
+        fut.add_done_callback(self._on_motion_done)
+        return fut
+
+    def home_async(self, speed=None, acc=None, speed2=None, timeout=20.0):
+        """
+        Homing on the axis worker thread, returns a concurrent.futures.Future,
+        see move_to_async. Defaults from the home_* settings.
+        """
+        S = self.settings
+        if speed is None:
+            speed = S['home_velocity']
+        if acc is None:
+            acc = S['home_acc']
+        if speed2 is None:
+            speed2 = S['home_velocity2']
+        u = self.units
+        fut = self.worker.home(u.velocity_to_raw(speed), u.acc_to_raw(acc),
+                               speed2=u.velocity_to_raw(speed2), timeout=timeout)
+        fut.add_done_callback(self._on_motion_done)
+        return fut
+
+    def _on_motion_done(self, fut):
+        try:
+            fut.result()
+        except CancelledError:
+            pass
+        except Exception as err:
+            print(f"{self.name} motion failed: {err!r}")
             
     def read_status(self):
-        S = self.settings
         s = self.d1.read_status()
         #print("read_status", s)
-        
-        S['ready_to_sw_on'] = s['rtso']
-        S['switched_on'] = s['so']
-        S['operation_enabled'] = s['oe']
-        S['fault'] = s['f']
-        S['voltage_enable'] = s['ve']
-        S['quick_stop'] = s['qs']
-        S['switch_on_disabled'] = s['sod']
-        S['warning'] = s['w']
-        S['remote_enable'] = s['rm']
-        S['target_reached'] = s['tr']
-        S['internal_limit_active'] = s['ila']
-        
+        self.update_status_settings(s)
         return s
+
+    # status flag setting --> statusword bit
+    STATUS_SETTINGS = [
+        ('ready_to_sw_on', 0),          # rtso
+        ('switched_on', 1),             # so
+        ('operation_enabled', 2),       # oe
+        ('fault', 3),                   # f
+        ('voltage_enable', 4),          # ve
+        ('quick_stop', 5),              # qs
+        ('switch_on_disabled', 6),      # sod
+        ('warning', 7),                 # w
+        ('remote_enable', 9),           # rm
+        ('target_reached', 10),         # tr
+        ('internal_limit_active', 11),  # ila
+        ]
+
+    def update_status_settings(self, s):
+        """push the status flags to the settings, only those whose bit changed"""
+        S = self.settings
+        x = int(s)
+        changed = x ^ self._last_status_word if self._last_status_word is not None else 0xFFFF
+        if not changed:
+            return
+        self._last_status_word = x
+        for name, bit in self.STATUS_SETTINGS:
+            if changed & (1 << bit):
+                S[name] = bool(x & (1 << bit))
     
+    def run_position_sequence(self, points, speed=None, acc=None, dwell=0.0, callback=None, timeout=10.0):
+        """
+        Visit a list of target positions, see IgusDryveD1.run_position_sequence.
+        points (um, list or numpy array) are all checked against the soft
+        limits before the first move. speed and acc default to the
+        profile_velocity and profile_acc settings.
+        Returns the per-point timing dict
+        """
+        S = self.settings
+        if speed is None:
+            speed = S['profile_velocity']
+        if acc is None:
+            acc = S['profile_acc']
+        u = self.units
+        raw_points = [int(p) for p in u.positions_to_raw(points)]
+        def on_point(i, pos, status):
+            S.target_pos.update_value(self._phys(pos), update_hardware=False)
+            if callback is not None:
+                return callback(i, points[i], status)
+        return self.d1.run_position_sequence(raw_points, u.velocity_to_raw(speed),
+                                             u.acc_to_raw(acc), dwell=dwell,
+                                             callback=on_point, timeout=timeout)
+
+    def stream_trajectory(self, trajectory, cycle_time=0.005, **kwargs):
+        """
+        Start streaming trajectory setpoints (um) in Cyclic Synchronous Position
+        mode, returns the running CyclicPositionStreamer (join() to wait).
+        Lists and arrays are converted and checked against the soft limits
+        up front, generators point by point.
+        """
+        from ScopeFoundryHW.igus_dryve.igus_dryveD1_csp import CyclicPositionStreamer
+        if hasattr(trajectory, '__len__'):
+            trajectory = self.units.positions_to_raw(trajectory)
+        else:
+            trajectory = map(self.units.position_to_raw, trajectory)
+        streamer = CyclicPositionStreamer(self.d1, trajectory, cycle_time=cycle_time, **kwargs)
+        streamer.start()
+        return streamer
+
+    def add_position_threshold(self, position, callback, direction='both', once=False):
+        """
+        callback(position, t, direction) with the interpolated time.time() at
+        which the stage crosses position, see PositionMonitor.add_threshold.
+        Returns the subscription for remove_position_subscription
+        """
+        mon = self.d1.position_monitor(rate=self.settings['trigger_rate'])
+        return mon.add_threshold(self.units.to_raw(position),
+                                 lambda raw, t, d: callback(position, t, d),
+                                 direction=direction, once=once)
+
+    def add_position_window(self, lo, hi, callback, once=False):
+        "callback((lo, hi), t, 'enter'/'exit'), see PositionMonitor.add_window"
+        mon = self.d1.position_monitor(rate=self.settings['trigger_rate'])
+        return mon.add_window(self.units.to_raw(lo), self.units.to_raw(hi),
+                              lambda raw, t, event: callback((lo, hi), t, event), once=once)
+
+    def remove_position_subscription(self, sub):
+        self.d1.position_monitor().remove(sub)
+
     def halt(self):
         self.d1.halt_motion()
         
     def start_home(self):
         self.d1.start_home()
     
+    def set_telemetry_enable(self, enable):
+        from ScopeFoundryHW.igus_dryve.igus_dryveD1_telemetry import TelemetryRecorder
+        S = self.settings
+        if enable:
+            if self.telemetry is None or self.telemetry.capacity != S['telemetry_capacity']:
+                if self.telemetry is not None:
+                    # its thread would go on polling with no reference left
+                    self.telemetry.stop()
+                # pauses the StatePublisher and feeds it, no extra traffic
+                self.telemetry = TelemetryRecorder(self.d1, rate=S['telemetry_rate'],
+                                                   capacity=S['telemetry_capacity'],
+                                                   publisher=self.state)
+            if not self.telemetry.running:
+                self.telemetry.start()
+        elif self.telemetry is not None:
+            self.telemetry.stop()
+
+    def set_telemetry_rate(self, rate):
+        if self.telemetry is not None:
+            self.telemetry.rate = rate
+
+    def update_metrics_settings(self):
+        S = self.settings
+        m = self.d1.metrics.summary()
+        def ms(x):
+            return x*1e3 if x is not None else 0.0
+        S['metrics_requests'] = m['requests']
+        S['metrics_errors'] = m['errors'] + m['sdo_errors']
+        S['metrics_latency_mean'] = ms(m['latency_mean'])
+        S['metrics_latency_p99'] = ms(m['latency_p99'])
+        S['metrics_latency_max'] = ms(m['latency_max'])
+        S['metrics_lock_wait_max'] = ms(m['lock_wait_max'])
+        S['metrics_wait_time'] = m['wait_time']
+        S['metrics_wait_timeouts'] = m['wait_timeouts']
+
+    def get_metrics_snapshot(self):
+        "per SDO object / *_and_wait metrics as a dict, see DryveMetrics.snapshot"
+        snap = self.d1.metrics.snapshot()
+        snap['ip_address'] = self.settings['ip_address']
+        return snap
+
+    def export_metrics(self, fname):
+        import json
+        with open(fname, 'w') as f:
+            json.dump(self.get_metrics_snapshot(), f, indent=2)
+
+    def reset_metrics(self):
+        if hasattr(self, 'd1'):
+            self.d1.metrics.reset()
+            self.update_metrics_settings()
+
     def disconnect(self):
     
         self.settings.disconnect_all_from_hardware()
         
+        if getattr(self, 'telemetry', None) is not None:
+            self.telemetry.stop()
+
+        if getattr(self, 'worker', None) is not None:
+            # halts a running move
+            self.worker.shutdown(cancel=True)
+            self.worker = None
+        
         if hasattr(self, 'd1'):
-            self.d1.close()
+            self.d1.release()
             del self.d1
             
     def threaded_update(self):
-        self.read_status()
-        self.settings.operating_mode.read_from_hardware()
-        self.settings.position.read_from_hardware()
-        time.sleep(0.1)
\ No newline at end of file
+        S = self.settings
+        now = time.monotonic()
+        if now - self._last_metrics_update >= S['metrics_interval']:
+            self._last_metrics_update = now
+            self.update_metrics_settings()
+        # no I/O here: the controller's StatePublisher polls (at the
+        # PollScheduler rates while moving / idle) for all its consumers.
+        # While telemetry records, the recorder's samples feed it instead
+        if not self.state.running:
+            self.state.start()
+        error = self.state.error
+        S['poll_error'] = repr(error) if error is not None else ''
+        snap = self.state.wait_newer(self._state_version, timeout=0.5)
+        if snap is None:
+            return
+        self._state_version = snap.version
+        if snap.status is not None:
+            self.update_status_settings(snap.status)
+        if snap.mode is not None:
+            S['operating_mode'] = snap.mode
+        if snap.position is not None:
+            S['position'] = self._phys(snap.position)
+        if self.state.paused:
+            # fed at the telemetry rate, the settings need far fewer updates
+            time.sleep(0.1)
\ No newline at end of file
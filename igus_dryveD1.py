@@ -8,27 +8,459 @@ import socket
 import time
 import struct
 import threading
+import functools
+import bisect
+from collections import namedtuple
+from concurrent.futures import Future
 
 
-class IgusDryveD1(object):
+class DryveD1SDOError(IOError):
+    "Data Telegram Error response from the dryve D1"
+
+
+class DryveD1ConnectionError(ConnectionError):
+    "TCP connection to the dryve D1 failed, timed out or was closed"
+
+
+class DryveD1Interrupted(Exception):
+    "a *_and_wait was interrupted through its interrupt event"
+
+
+class SDOCodec(object):
+    """
+    Precompiled Modbus TCP gateway (CANopen SDO) telegram for one
+    (write, sdo_obj, sub_index, datatype) combination.
     
-    def __init__(self, ip_address, port=502, initialize=True, debug=False):
-        self.debug=debug 
-        self.ip_address=ip_address 
-        self.port=port
+    The 17 header bytes after the transaction id are built once, a telegram
+    is then packed with a single precompiled struct.Struct straight into
+    the caller's send buffer. Use sdo_codec() to get the cached instance.
+    """
+    
+    BYTE_COUNT = {'H':2, 'B': 1, 'I': 4, 'i':4, 'h':2, 'b':1}
+    
+    def __init__(self, write, sdo_obj, sub_index, datatype):
+        self.write = bool(write)
+        self.sdo_obj = sdo_obj
+        self.sub_index = sub_index
+        self.datatype = datatype
         
-        self.lock = threading.Lock()
+        byte_count = self.BYTE_COUNT[datatype]
+        data_len = byte_count if self.write else 0
+
+        self.header = bytes([
+            0,0, # 2,3 # Protocol Identifier (0,0) = Modbus
+            0,data_len+13, # 4,5 # Length of rest of telegram 
+            0, # 6 # Unit Identifier (not used)
+            0x2B, # Function Code Modbus TCPO Gateway (CANopen) = 0x2B (43)
+            0x0D, # MEI type
+            (0,1)[self.write], 0, # Protocol option fields / Protocol control Read = 0, Write=1
+            0, # Node Id
+            sdo_obj >> 8, sdo_obj & 0x00FF, # SDO Object (ex statusword=0x6041, controlword=0x6042)
+            sub_index, # SDO Objects Sub Index
+            0, 0, # Starting address (Don't user)
+            0, # SDO object ( Don't use)
+            byte_count, # 1-4 Byte count detail depending the SDO object in byte 12 and 13. 
+            ])
+        
+        # transaction identifier (byte swapped so the whole telegram is one
+        # little endian struct), header, data (little endian)
+        if self.write:
+            self.struct = struct.Struct(f'<H17s{datatype}')
+        else:
+            self.struct = struct.Struct('<H17s')
+        self.size = self.struct.size
+        self.data_struct = struct.Struct(f'<{datatype}')
+
+    def pack_into(self, buf, offset, tid, data=None):
+        tid_swapped = ((tid & 0xFF) << 8) | (tid >> 8)
+        if self.write:
+            self.struct.pack_into(buf, offset, tid_swapped, self.header, data)
+        else:
+            self.struct.pack_into(buf, offset, tid_swapped, self.header)
+        return self.size
+    
+    def build(self, data=None, tid=0):
+        telegram = bytearray(self.size)
+        self.pack_into(telegram, 0, tid, data)
+        return telegram
+
+    def decode(self, resp):
+        # transaction id is matched by the receiver, check protocol id
+        assert resp[2] == 0 and resp[3] == 0
         
+        if resp[7] != 0x2B:
+            # Data Telegram Error
+            print(f"Data Telegram Error {resp[7]=:02X} in response to {self.sdo_obj:04X}h")
+            print(f"{resp[8]=:02X}")
+        
+        if len(resp) > 19:
+            return self.data_struct.unpack_from(resp, 19)[0]
+        return None
+
+    def decode_checked(self, resp):
+        "like decode, but raises DryveD1SDOError for a Data Telegram Error"
+        if resp[7] != 0x2B:
+            raise DryveD1SDOError(
+                f"Data Telegram Error {resp[7]:02X} {resp[8]:02X} for {self.sdo_obj:04X}h sub {self.sub_index}")
+        return self.decode(resp)
+
+
+@functools.lru_cache(maxsize=None)
+def sdo_codec(write, sdo_obj, sub_index=0, datatype='H'):
+    return SDOCodec(write, sdo_obj, sub_index, datatype)
+
+
+# statusword 6041h fields: name --> (shift, mask)
+STATUS_BITS = {
+    'ms':  (14, 0b11), # Manufacturer Specific
+    'oms': (12, 0b11), # Operating mode specific
+    'ila': (11, 0b01), # Internal Limit Active
+    'tr':  (10, 0b01), # Target Reached
+    'rm':  ( 9, 0b01), # Remote (Enable switch DI7)
+    'ms8': ( 8, 0b01), # Manufacturer Specific
+    'w' :  ( 7, 0b01), # Warning
+    'sod': ( 6, 0b01), # Switch on Disabled
+    'qs':  ( 5, 0b01), # Quick Stop
+    've':  ( 4, 0b01), # Voltage Enable
+    'f':   ( 3, 0b01), # Fault
+    'oe':  ( 2, 0b01), # Operation Enabled
+    'so':  ( 1, 0b01), # Switched On
+    'rtso':( 0, 0b01), # Ready to Switch On
+    }
+
+
+class DryveStatus(int):
+    """
+    Statusword 6041h. An int with the STATUS_BITS fields as properties
+    (status.tr) that can also be indexed like the old status dict
+    (status['tr']). Instances are interned by from_word(), so decoding a
+    statusword seen before does not allocate.
+    """
+    __slots__ = ()
+    
+    _interned = {}
+    
+    @classmethod
+    def from_word(cls, x):
         try:
-            self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        except socket.error:
-            print ('failed to create socket')         
-        self.s.connect((self.ip_address, self.port))
+            return cls._interned[x]
+        except KeyError:
+            return cls._interned.setdefault(x, cls(x))
+    
+    def __getitem__(self, key):
+        shift, mask = STATUS_BITS[key]
+        return (self >> shift) & mask
+    
+    def keys(self):
+        return STATUS_BITS.keys()
+    
+    def as_dict(self):
+        return {key: self[key] for key in STATUS_BITS}
+    
+    def __repr__(self):
+        flags = ' '.join(key for key, (shift, mask) in STATUS_BITS.items()
+                         if mask == 1 and (self >> shift) & 1)
+        return f"DryveStatus(0x{int(self):04X} oms={self['oms']:02b} {flags})"
+
+def _status_field(shift, mask):
+    return property(lambda self: (self >> shift) & mask)
+
+for _key, (_shift, _mask) in STATUS_BITS.items():
+    setattr(DryveStatus, _key, _status_field(_shift, _mask))
+
+
+def decode_status_array(words):
+    """
+    Decode an array of logged statuswords at once. Returns a dict of
+    STATUS_BITS name --> numpy array (bool for single bit fields, uint8 for 'ms', 'oms')
+    """
+    import numpy as np
+    words = np.asarray(words, dtype=np.uint16)
+    out = {}
+    for key, (shift, mask) in STATUS_BITS.items():
+        field = (words >> shift) & mask
+        out[key] = field.astype(bool) if mask == 1 else field.astype(np.uint8)
+    return out
+
+
+class DryveMetrics(object):
+    """
+    Low overhead driver instrumentation, kept in IgusDryveD1.metrics:
+    request counts and latency histograms per SDO object, time spent
+    waiting for the send lock, error counts and time spent in each
+    *_and_wait loop. snapshot() returns everything as a plain dict
+    (JSON serializable), export_json() writes it to a file.
+    """
+
+    # histogram bucket upper edges (s): 50us * 2^k, plus overflow bucket
+    EDGES = [50e-6 * 2**k for k in range(17)]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.t_start = time.time()
+            self.requests = {} # (sdo_obj, sub_index) --> [count, errors, total, max, buckets]
+            self.sdo_errors = {} # Data Telegram Error code --> count
+            self.waits = {} # *_and_wait name --> [count, timeouts, total, max, polls]
+            # updated under IgusDryveD1.lock, so no locking here
+            self.lock_waits = 0
+            self.lock_wait_total = 0.0
+            self.lock_wait_max = 0.0
+
+    def _entry(self, key):
+        entry = self.requests.get(key)
+        if entry is None:
+            entry = self.requests[key] = [0, 0, 0.0, 0.0, [0]*(len(self.EDGES)+1)]
+        return entry
+
+    def record_request(self, key, dt, error=False):
+        i = bisect.bisect_left(self.EDGES, dt)
+        with self._lock:
+            entry = self._entry(key)
+            entry[0] += 1
+            if error:
+                entry[1] += 1
+            entry[2] += dt
+            if dt > entry[3]:
+                entry[3] = dt
+            entry[4][i] += 1
+
+    def record_sdo_error(self, code):
+        with self._lock:
+            self.sdo_errors[code] = self.sdo_errors.get(code, 0) + 1
+
+    def record_lock_wait(self, dt):
+        # caller holds IgusDryveD1.lock
+        self.lock_waits += 1
+        self.lock_wait_total += dt
+        if dt > self.lock_wait_max:
+            self.lock_wait_max = dt
+
+    def record_wait(self, name, dt, polls, timed_out=False):
+        with self._lock:
+            entry = self.waits.get(name)
+            if entry is None:
+                entry = self.waits[name] = [0, 0, 0.0, 0.0, 0]
+            entry[0] += 1
+            if timed_out:
+                entry[1] += 1
+            entry[2] += dt
+            if dt > entry[3]:
+                entry[3] = dt
+            entry[4] += polls
+
+    @classmethod
+    def percentile(cls, buckets, p):
+        "upper bucket edge below which fraction p of the samples fall (inf for the overflow bucket)"
+        count = sum(buckets)
+        if count == 0:
+            return None
+        target = p*count
+        cumulative = 0
+        for i, n in enumerate(buckets):
+            cumulative += n
+            if cumulative >= target:
+                break
+        return cls.EDGES[i] if i < len(cls.EDGES) else float('inf')
+
+    def summary(self):
+        "totals over all objects"
+        with self._lock:
+            entries = list(self.requests.values())
+            waits = list(self.waits.values())
+            sdo_errors = sum(self.sdo_errors.values())
+        count = sum(e[0] for e in entries)
+        buckets = [sum(b) for b in zip(*[e[4] for e in entries])] or [0]
+        return dict(
+            requests=count,
+            errors=sum(e[1] for e in entries),
+            sdo_errors=sdo_errors,
+            latency_mean=sum(e[2] for e in entries)/count if count else None,
+            latency_p50=self.percentile(buckets, 0.5),
+            latency_p99=self.percentile(buckets, 0.99),
+            latency_max=max([e[3] for e in entries], default=None),
+            lock_wait_total=self.lock_wait_total,
+            lock_wait_max=self.lock_wait_max,
+            wait_time=sum(w[2] for w in waits),
+            wait_timeouts=sum(w[1] for w in waits),
+            )
+
+    def snapshot(self):
+        with self._lock:
+            requests = {f"{sdo_obj:04X}h.{sub}": dict(
+                            count=e[0], errors=e[1],
+                            latency_mean=e[2]/e[0] if e[0] else None,
+                            latency_max=e[3],
+                            latency_p50=self.percentile(e[4], 0.5),
+                            latency_p99=self.percentile(e[4], 0.99),
+                            buckets=list(e[4]))
+                        for (sdo_obj, sub), e in sorted(self.requests.items())}
+            waits = {name: dict(count=w[0], timeouts=w[1], total=w[2],
+                                mean=w[2]/w[0] if w[0] else None, max=w[3], polls=w[4])
+                     for name, w in self.waits.items()}
+            sdo_errors = {f"{code:02X}h": n for code, n in self.sdo_errors.items()}
+        return dict(
+            t_start=self.t_start,
+            t_snapshot=time.time(),
+            bucket_edges=list(self.EDGES),
+            requests=requests,
+            sdo_errors=sdo_errors,
+            lock=dict(count=self.lock_waits, total=self.lock_wait_total,
+                      max=self.lock_wait_max),
+            waits=waits,
+            summary=self.summary(),
+            )
+
+    def export_json(self, fname):
+        import json
+        with open(fname, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+# CANopen object dictionary entry used by the driver
+# access: 'ro', 'rw' or 'wo'. unit: in controller position units (pu),
+# see igus_dryveD1_units. cacheable: last confirmed value kept in od_cache
+ODObject = namedtuple('ODObject', 'name index sub datatype access unit cacheable description')
+
+OBJECT_DICTIONARY = {o.name: o for o in [
+    ODObject('controlword',          0x6040, 0, 'H', 'rw', None,    False, "Controlword"),
+    ODObject('statusword',           0x6041, 0, 'H', 'ro', None,    False, "Statusword"),
+    ODObject('mode_of_operation',    0x6060, 0, 'B', 'rw', None,    False, "Modes of operation"),
+    ODObject('mode_display',         0x6061, 0, 'B', 'ro', None,    True,  "Modes of operation display"),
+    ODObject('actual_position',      0x6064, 0, 'i', 'ro', 'pu',    False, "Position actual value"),
+    ODObject('actual_velocity',      0x606C, 0, 'i', 'ro', 'pu/s',  False, "Velocity actual value"),
+    ODObject('target_position',      0x607A, 0, 'i', 'rw', 'pu',    False, "Target position"),
+    ODObject('soft_limit_min',       0x607D, 1, 'i', 'rw', 'pu',    True,  "Software position limit min"),
+    ODObject('soft_limit_max',       0x607D, 2, 'i', 'rw', 'pu',    True,  "Software position limit max"),
+    ODObject('profile_velocity',     0x6081, 0, 'I', 'rw', 'pu/s',  True,  "Profile velocity"),
+    ODObject('profile_acc',          0x6083, 0, 'I', 'rw', 'pu/s2', True,  "Profile acceleration"),
+    ODObject('feed_constant',        0x6092, 1, 'I', 'rw', None,    True,  "Feed constant Feed"),
+    ODObject('feed_revs',            0x6092, 2, 'I', 'rw', None,    True,  "Feed constant Shaft revolutions"),
+    ODObject('homing_method',        0x6098, 0, 'b', 'rw', None,    True,  "Homing method"),
+    ODObject('home_velocity',        0x6099, 1, 'I', 'rw', 'pu/s',  True,  "Homing Search Velocity for Switch"),
+    # used when the limit switch was found and the reference point is set
+    ODObject('home_velocity2',       0x6099, 2, 'I', 'rw', 'pu/s',  True,  "Homing Search Velocity for Zero"),
+    ODObject('home_acc',             0x609A, 0, 'I', 'rw', 'pu/s2', True,  "Homing Acceleration"),
+    ODObject('interpolation_period', 0x60C2, 1, 'B', 'rw', None,    False, "Interpolation time period value"),
+    ODObject('interpolation_index',  0x60C2, 2, 'b', 'rw', None,    False, "Interpolation time index"),
+    ]}
+
+
+class IgusDryveD1(object):
+    
+    RX_BUFFER_SIZE = 4096
+    
+    # configuration objects (sdo_obj, sub_index) --> datatype whose last
+    # confirmed value is kept in od_cache, writes of an unchanged value are
+    # skipped. They are restored after a reconnect, see restore_state
+    # (0x6061, 0) Modes of operation display: see write_mode_and_wait
+    CACHEABLE = {(o.index, o.sub): o.datatype
+                 for o in OBJECT_DICTIONARY.values() if o.cacheable}
+    
+    # per (ip_address, port) connections shared by IgusDryveD1.shared(),
+    # a Future while the connection is being made
+    _pool = {}
+    _pool_lock = threading.Lock()
+    
+    def __init__(self, ip_address, port=502, initialize=True, debug=False, pipeline=True,
+                 use_cache=True, metrics=True, timeout=2.0, auto_reconnect=True,
+                 fast_initialize=False, transport=None):
+        self.debug=debug
+        self.ip_address=ip_address
+        self.port=port
+        # socket timeout (s): a response later than this counts as a lost connection
+        self.timeout = timeout
+
+        # on a lost connection reconnect (reconnect_attempts tries, waiting
+        # reconnect_delay, doubling up to reconnect_delay_max in between)
+        # and restore the drive state, see reconnect
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_attempts = 10
+        self.reconnect_delay = 0.1
+        self.reconnect_delay_max = 5.0
+        self.connection_id = 0 # incremented on each reconnect
+        self.reconnects = 0
+        self.restored_writes = 0
+        self.last_status_word = None
+        self.closed = False
+        # restoring: set on the thread running restore_state, its requests
+        # must not start another reconnect
+        self._local = threading.local()
+        # cleared while a reconnect and restore_state are in progress
+        self._restored = threading.Event()
+        self._restored.set()
+        self._position_monitor = None
+        self._state_publisher = None
+        # TelegramCapture while capturing, see start_capture
+        self._capture = None
+        self._pool_refs = 0
+        # pipeline=True allows several telegrams in flight on the socket,
+        # responses are matched to their request by Modbus transaction id
+        self.pipeline=pipeline
+
+        # *_and_wait polling: first poll interval, backoff factor and maximum
+        # interval. With an expected move duration, polling is sparse
+        # (poll_interval_max) until arrival_margin seconds before the
+        # expected arrival and dense after that.
+        self.poll_interval = 0.002
+        self.poll_backoff = 1.5
+        self.poll_interval_max = 0.05
+        self.arrival_margin = 0.05
+        self.last_wait_polls = 0
+        self.last_wait_time = 0.0
+
+        # write-through cache of configuration objects, see CACHEABLE
+        # use_cache=False bypasses it (every write goes to the controller)
+        self.use_cache = use_cache
+        self.od_cache = {}
+        self.cache_skips = 0
+
+        # event counters, so pollers can tell that mode or motion changed
+        self.mode_writes = 0
+        self.move_triggers = 0
+
+        # request latency / error / wait instrumentation, see DryveMetrics
+        # metrics=False turns it off
+        self.metrics = DryveMetrics() if metrics else None
+
+        # self.lock guards sending on the socket (and transaction id allocation)
+        self.lock = threading.Lock()
+
+        # receive side: one waiting thread at a time reads frames from the socket
+        # and hands them to the other waiters by transaction id
+        self._rx_cond = threading.Condition()
+        self._rx_busy = False
+        self._pending = {} # transaction id --> response telegram (None until it arrives)
+        self._next_tid = 0
+
+        # reusable send buffer for SDO requests (guarded by self.lock)
+        self._tx_buf = bytearray(self.RX_BUFFER_SIZE)
+        self._tx_view = memoryview(self._tx_buf)
+
+        # preallocated receive buffer, frames are parsed in place
+        self._rx_buf = bytearray(self.RX_BUFFER_SIZE)
+        self._rx_view = memoryview(self._rx_buf)
+        self._rx_reset()
+        self.rx_frames = 0
+        self.rx_partial_reads = 0 # frames that arrived in more than one recv
+        self._rx_split = False
+        self.rx_resyncs = 0 # bytes skipped to find a valid frame header
+
+        if transport is not None:
+            # socket-like object instead of a TCP connection, eg
+            # igus_dryveD1_capture.ReplayTransport
+            self.s = transport
+            self.auto_reconnect = False
+        else:
+            self.s = self._open_socket()
         if self.debug==True:
             print ('Socket created')
 
         if initialize:
-            self.initialize()
+            self.initialize(fast=fast_initialize)
 
         # self.read_mode()
         # self.write_mode_and_wait(6)
@@ -38,11 +470,209 @@ class IgusDryveD1(object):
         #self.go_abs_pos_and_wait(pos=10000, speed=1000, acc=10000, timeout=10)
         return
     
+    @classmethod
+    def shared(cls, ip_address, port=502, **kwargs):
+        """
+        Connection to ip_address shared by everything in this process that
+        asks for it, eg several hardware components and scripts using the
+        same controller. kwargs (see __init__) only apply when the connection
+        is created. Call release() instead of close() when done.
+        While one thread connects, others asking for the same controller
+        wait for that connection; different controllers connect in parallel.
+        """
+        key = (ip_address, port)
+        while True:
+            with cls._pool_lock:
+                entry = cls._pool.get(key)
+                if isinstance(entry, Future):
+                    # another thread is connecting, wait for it below
+                    building = entry
+                elif entry is None or entry.closed:
+                    building = None
+                    cls._pool[key] = pending = Future()
+                else:
+                    entry._pool_refs += 1
+                    return entry
+            if building is not None:
+                building.result() # raises if that connect failed
+                continue
+            # connect and initialize outside the lock, so connections to
+            # different controllers are made in parallel
+            try:
+                d1 = cls(ip_address, port, **kwargs)
+            except BaseException as err:
+                with cls._pool_lock:
+                    if cls._pool.get(key) is pending:
+                        del cls._pool[key]
+                pending.set_exception(err)
+                raise
+            with cls._pool_lock:
+                d1._pool_refs += 1
+                cls._pool[key] = d1
+            pending.set_result(d1)
+            return d1
+
+    def release(self):
+        "give up a connection from shared(), closed when the last user releases it"
+        with self._pool_lock:
+            self._pool_refs -= 1
+            if self._pool_refs > 0:
+                return
+            key = (self.ip_address, self.port)
+            if self._pool.get(key) is self:
+                del self._pool[key]
+        self.close()
+
     def close(self):
+        if self._position_monitor is not None:
+            self._position_monitor.stop()
+        if self._state_publisher is not None:
+            self._state_publisher.stop()
+        self.stop_capture()
+        self.closed = True
+        self.invalidate_cache()
         self.s.close()
         del self.s
 
-    def initialize(self):
+    def start_capture(self, fname):
+        """
+        Record every request and response telegram with its timestamp to
+        fname, see igus_dryveD1_capture
+        """
+        from ScopeFoundryHW.igus_dryve.igus_dryveD1_capture import TelegramCapture
+        self.stop_capture()
+        self._capture = TelegramCapture(fname)
+
+    def stop_capture(self):
+        capture, self._capture = self._capture, None
+        if capture is not None:
+            capture.close()
+
+    def _open_socket(self):
+        s = socket.create_connection((self.ip_address, self.port), timeout=self.timeout)
+        # telegrams are small and latency bound, send them right away
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # notice a dead link (cable, controller power) on an idle connection
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for opt, value in (('TCP_KEEPIDLE', 2), ('TCP_KEEPINTVL', 1), ('TCP_KEEPCNT', 3)):
+            if hasattr(socket, opt):
+                s.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), value)
+        return s
+
+    def reconnect(self, connection_id=None):
+        """
+        Replace the connection and restore the drive state (restore_state).
+        Transactions in flight fail with DryveD1ConnectionError.
+        connection_id: the connection that failed, if another thread has
+        already replaced it, only wait until that thread has restored the
+        drive state.
+        """
+        desired = dict(self.od_cache)
+        was_enabled = self.last_status_word is not None and bool(self.last_status_word & 0x04)
+        with self.lock:
+            if connection_id is not None and connection_id != self.connection_id:
+                replaced = True
+            else:
+                replaced = False
+                self._restored.clear()
+                try:
+                    self._replace_connection()
+                except BaseException:
+                    self._restored.set()
+                    raise
+        if replaced:
+            # requests of other threads fail until the state is restored
+            self._restored.wait()
+            return
+        try:
+            print(f"reconnected to {self.ip_address}")
+            self.restore_state(desired, was_enabled)
+        finally:
+            self._restored.set()
+
+    def _replace_connection(self):
+        # caller holds self.lock
+        try:
+            self.s.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.s.close()
+        with self._rx_cond:
+            # a receiving thread gets an error from the closed socket
+            while self._rx_busy:
+                self._rx_cond.wait()
+            for slot in self._pending.values():
+                if not slot[3]:
+                    slot[2] = DryveD1ConnectionError("connection to dryve D1 was reset")
+                    slot[3] = True
+            self._rx_reset()
+            self._rx_cond.notify_all()
+        self.invalidate_cache()
+        delay = self.reconnect_delay
+        for attempt in range(self.reconnect_attempts):
+            try:
+                self.s = self._open_socket()
+                break
+            except OSError as err:
+                print(f"reconnect to {self.ip_address} failed ({err}), retry in {delay:.1f} s")
+                time.sleep(delay)
+                delay = min(2*delay, self.reconnect_delay_max)
+        else:
+            raise DryveD1ConnectionError(
+                f"could not reconnect to {self.ip_address} after {self.reconnect_attempts} attempts")
+        self.connection_id += 1
+        self.reconnects += 1
+
+    def restore_state(self, desired, was_enabled=False):
+        """
+        After a reconnect: re-enable the drive if it was operation enabled and
+        write back those configuration values (desired: od_cache contents from
+        before) that the controller does not have any more. The values are
+        read back in one request first, so an uninterrupted controller only
+        costs one round-trip.
+        """
+        self._local.restoring = True
+        try:
+            status = self.read_status()
+            if was_enabled and not status.oe:
+                self.initialize(fast=True)
+            keys = [key for key in desired if key in self.CACHEABLE]
+            # confirmed values go into od_cache
+            self.ask_many([dict(sdo_obj=k[0], sub_index=k[1], datatype=self.CACHEABLE[k])
+                           for k in keys])
+            writes = [dict(write=True, sdo_obj=k[0], sub_index=k[1],
+                           datatype=self.CACHEABLE[k], data=desired[k])
+                      for k in keys if k != (0x6061, 0)]
+            skips = self.cache_skips
+            # unchanged values are skipped by the cache
+            self.ask_many(writes)
+            self.restored_writes += len(writes) - (self.cache_skips - skips)
+            if (0x6061, 0) in desired:
+                self.write_mode_and_wait(desired[(0x6061, 0)])
+        finally:
+            self._local.restoring = False
+
+    def initialize(self, fast=False):
+        """
+        Fault reset and CiA 402 state transitions up to Operation Enabled.
+        fast=True checks the statusword first and only does the transitions
+        that have not happened yet (nothing at all if already enabled
+        without fault).
+        """
+        self.invalidate_cache()
+        if fast:
+            status = self.read_status()
+            assert status['rm'] == 1
+            if not status['f']:
+                if status['oe']:
+                    return
+                if status['so']:
+                    self.write_and_wait_operation_enable()
+                    return
+                if status['rtso'] and not status['sod']:
+                    self.write_and_wait_switch_on()
+                    self.write_and_wait_operation_enable()
+                    return
         self.write_status_reset()
         # Make sure enable switch is on
         assert self.read_status()['rm'] == 1
@@ -64,16 +694,282 @@ class IgusDryveD1(object):
         # print("Feed_constant_Shaft_revolutions:", self.ask(write=False, sdo_obj=0x6092, sub_index=2, datatype='I'))
 
 
-    def ask_telegram(self, telegram):
+    def _new_transaction_id(self):
+        # caller must hold self.lock
+        self._next_tid = (self._next_tid + 1) & 0xFFFF
+        return self._next_tid
+
+    def send_telegrams(self, telegrams, decoders=None):
+        """
+        Stamp each telegram (bytearray) with a fresh transaction id and send
+        them back-to-back in a single write. Returns the list of transaction ids.
+        
+        decoders: optional list of functions, one per telegram. Each is called
+        with its response frame (a memoryview into the receive buffer, only
+        valid during the call) and its return value is what recv_telegram
+        hands back. Default is bytes(), ie a copy of the response telegram.
+        """
+        if decoders is None:
+            decoders = [bytes]*len(telegrams)
+        t = time.perf_counter()
+        with self.lock:
+            if self.metrics is not None:
+                self.metrics.record_lock_wait(time.perf_counter() - t)
+            tids = []
+            for telegram in telegrams:
+                tid = self._new_transaction_id()
+                telegram[0] = tid >> 8
+                telegram[1] = tid & 0xFF
+                tids.append(tid)
+                if self.debug:
+                    print(f"ask -->{telegram.hex()}")
+                if self._capture is not None:
+                    self._capture.write(0, telegram)
+            with self._rx_cond:
+                for tid, decoder in zip(tids, decoders):
+                    # [decoder, result, exception, done]
+                    self._pending[tid] = [decoder, None, None, False]
+            try:
+                self.s.sendall(b''.join(telegrams))
+            except OSError as err:
+                self._drop_pending(tids)
+                raise DryveD1ConnectionError(f"send to dryve D1 failed: {err}") from err
+            except BaseException:
+                self._drop_pending(tids)
+                raise
+        return tids
+
+    def send_sdo_requests(self, requests, decoders=None):
+        """
+        Pack a list of (SDOCodec, data) requests into the send buffer and send
+        them in a single write. Responses are decoded by the codec, or by
+        decoders (see send_telegrams) if given.
+        Returns the list of transaction ids.
+        """
+        if decoders is None:
+            decoders = [codec.decode for codec, data in requests]
+        t = time.perf_counter()
         with self.lock:
-            self.s.send(telegram)
-            resp = self.s.recv(24)
+            if self.metrics is not None:
+                self.metrics.record_lock_wait(time.perf_counter() - t)
+            tids = []
+            for codec, data in requests:
+                tids.append(self._new_transaction_id())
+            with self._rx_cond:
+                for tid, decoder in zip(tids, decoders):
+                    # [decoder, result, exception, done]
+                    self._pending[tid] = [decoder, None, None, False]
+            try:
+                offset = 0
+                for tid, (codec, data) in zip(tids, requests):
+                    if offset + codec.size > len(self._tx_buf):
+                        self.s.sendall(self._tx_view[:offset])
+                        offset = 0
+                    n = codec.pack_into(self._tx_buf, offset, tid, data)
+                    if self.debug:
+                        print(f"ask -->{self._tx_view[offset:offset+n].hex()}")
+                    if self._capture is not None:
+                        self._capture.write(0, self._tx_view[offset:offset+n])
+                    offset += n
+                self.s.sendall(self._tx_view[:offset])
+            except OSError as err:
+                self._drop_pending(tids)
+                raise DryveD1ConnectionError(f"send to dryve D1 failed: {err}") from err
+            except BaseException:
+                # eg struct.error for a value out of range of the datatype
+                self._drop_pending(tids)
+                raise
+        return tids
+
+    def _drop_pending(self, tids):
+        with self._rx_cond:
+            for tid in tids:
+                self._pending.pop(tid, None)
+
+    def _collect(self, tids):
+        # wait for all transactions, returns list of (result, exception)
+        outcomes = []
+        for i, tid in enumerate(tids):
+            try:
+                outcomes.append((self.recv_telegram(tid), None))
+            except DryveD1ConnectionError as err:
+                # the connection is gone, the rest of the batch would each
+                # wait for a socket timeout
+                rest = tids[i+1:]
+                self._drop_pending(rest)
+                outcomes.extend([(None, err)]*(1 + len(rest)))
+                break
+            except Exception as err:
+                outcomes.append((None, err))
+        return outcomes
+
+    def recv_telegrams(self, tids):
+        """
+        Responses for a list of transaction ids. All of them are collected
+        before the first error (if any) is raised.
+        """
+        outcomes = self._collect(tids)
+        for result, err in outcomes:
+            if err is not None:
+                raise err
+        return [result for result, err in outcomes]
+
+    def recv_telegram(self, tid):
+        """
+        Wait for the (decoded) response to transaction id tid.
+        Whichever waiting thread finds the socket idle reads the next frame
+        and decodes it for its owner, so any number of requests can be
+        outstanding at once.
+        """
+        with self._rx_cond:
+            while True:
+                slot = self._pending[tid]
+                if slot[3]:
+                    del self._pending[tid]
+                    if slot[2] is not None:
+                        raise slot[2]
+                    return slot[1]
+                if self._rx_busy:
+                    self._rx_cond.wait()
+                    continue
+                self._rx_busy = True
+                self._rx_cond.release()
+                ok = False
+                try:
+                    self._recv_and_dispatch()
+                    ok = True
+                finally:
+                    self._rx_cond.acquire()
+                    self._rx_busy = False
+                    self._rx_cond.notify_all()
+                    if not ok: # receive failed, give up on this transaction
+                        self._pending.pop(tid, None)
+
+    def _recv_and_dispatch(self):
+        # called with self._rx_busy set, so the receive buffer is ours
+        frame = self._recv_frame()
         if self.debug:
-            print(f"ask -->{telegram.hex()}")
-            print(f"    <--{resp.hex()}")
-        return resp
-    
-    
+            print(f"    <--{frame.hex()}")
+        if self._capture is not None:
+            self._capture.write(1, frame)
+        rx_tid = (frame[0] << 8) | frame[1]
+        if frame[7] != 0x2B and self.metrics is not None:
+            # Data Telegram Error, exception code in byte 8
+            self.metrics.record_sdo_error(frame[8])
+        slot = self._pending.get(rx_tid)
+        if slot is None:
+            if self.debug:
+                print(f"dropping response with unknown transaction id {rx_tid}")
+            return
+        # decode while the frame is still in the buffer
+        try:
+            slot[1] = slot[0](frame)
+        except Exception as err:
+            slot[2] = err
+        slot[3] = True
+
+    def _rx_reset(self):
+        self._rx_start = 0
+        self._rx_end = 0
+
+    def _rx_fill(self, n):
+        """Make sure at least n unread bytes are in the receive buffer"""
+        if self._rx_start + n > self.RX_BUFFER_SIZE:
+            # compact: move the unread bytes to the front of the buffer
+            unread = self._rx_end - self._rx_start
+            self._rx_view[:unread] = self._rx_view[self._rx_start:self._rx_end]
+            self._rx_start = 0
+            self._rx_end = unread
+        while self._rx_end - self._rx_start < n:
+            if self._rx_end > self._rx_start:
+                # part of the frame is here already, TCP split it
+                self._rx_split = True
+            try:
+                k = self.s.recv_into(self._rx_view[self._rx_end:])
+            except OSError as err: # including socket.timeout
+                raise DryveD1ConnectionError(f"receive from dryve D1 failed: {err}") from err
+            if k == 0:
+                raise DryveD1ConnectionError("connection closed by dryve D1")
+            self._rx_end += k
+
+    def _recv_frame(self):
+        """
+        Read exactly one response frame, using the MBAP length field (bytes 4,5).
+        Returns a memoryview into the receive buffer, valid until the next read.
+        If the stream does not look like a valid header, bytes are skipped until
+        it does (counted in rx_resyncs).
+        """
+        buf = self._rx_buf
+        self._rx_split = False
+        while True:
+            # MBAP header: transaction id (2), protocol id (2), length of rest (2),
+            # unit id (1), then the function code 0x2B (0xAB for exception responses)
+            self._rx_fill(8)
+            s = self._rx_start
+            length = (buf[s+4] << 8) | buf[s+5]
+            if (buf[s+2] or buf[s+3] or not (2 <= length <= 254)
+                    or (buf[s+7] & 0x7F) != 0x2B):
+                self.rx_resyncs += 1
+                self._rx_start += 1
+                continue
+            self._rx_fill(6 + length)
+            s = self._rx_start # may have moved while compacting
+            self._rx_start = s + 6 + length
+            self.rx_frames += 1
+            if self._rx_split:
+                self.rx_partial_reads += 1
+            if self._rx_start == self._rx_end:
+                self._rx_reset()
+            return self._rx_view[s:s+6+length]
+
+    def get_rx_stats(self):
+        """
+        frames: response frames received, partial_reads: frames that
+        arrived in more than one recv, resyncs: bytes skipped to find a
+        valid frame header
+        """
+        return dict(frames=self.rx_frames,
+                    partial_reads=self.rx_partial_reads,
+                    resyncs=self.rx_resyncs)
+
+    def ask_telegram(self, telegram):
+        return self.ask_telegrams([telegram])[0]
+
+    def ask_telegrams(self, telegrams, decoders=None):
+        """
+        Send several telegrams and return their responses in the same order.
+        With self.pipeline all are sent before the first response is awaited,
+        so the whole batch costs about one network round-trip.
+        """
+        # stamped in place, so keep the caller's bytearrays
+        telegrams = [t if isinstance(t, bytearray) else bytearray(t) for t in telegrams]
+        if decoders is None:
+            decoders = [bytes]*len(telegrams)
+        t0 = time.perf_counter()
+        if not self.pipeline:
+            resps = []
+            for telegram, decoder in zip(telegrams, decoders):
+                tid, = self.send_telegrams([telegram], [decoder])
+                resps.append(self.recv_telegram(tid))
+        else:
+            tids = self.send_telegrams(telegrams, decoders)
+            resps = self.recv_telegrams(tids)
+        if self.metrics is not None:
+            # raw telegrams: SDO object in bytes 12,13, sub index in byte 14
+            dt = (time.perf_counter() - t0)/(1 if self.pipeline else len(telegrams))
+            for telegram in telegrams:
+                if len(telegram) >= 15:
+                    self.metrics.record_request(
+                        ((telegram[12] << 8) | telegram[13], telegram[14]), dt)
+        return resps
+
+    def build_telegram(self, write=False, sdo_obj=0x6041, sub_index=0, datatype='H', data=None):
+        """
+        Build a Modbus TCP gateway (CANopen SDO) telegram. The transaction
+        identifier (bytes 0,1) is filled in when the telegram is sent.
+        """
+        return sdo_codec(bool(write), sdo_obj, sub_index, datatype).build(data)
+
     def ask(self, write=False, sdo_obj=0x6041, sub_index=0, datatype='H', data=None ):
         
         """datatype follows python struct naming conventions:
@@ -81,77 +977,142 @@ class IgusDryveD1(object):
         B unsigned char (1 byte) --> python int
         H unsigned short (2 byte) --> python int
         I unsigned int (4 byte) --> python int
+        i, h, b signed int (4, 2, 1 byte) --> python int
         """
+        return self.ask_many([dict(write=write, sdo_obj=sdo_obj, sub_index=sub_index,
+                                   datatype=datatype, data=data)])[0]
+
+    def ask_many(self, requests):
+        """
+        Pipelined version of ask. requests is a list of dicts of ask() keyword
+        arguments, returns the list of results in the same order, eg:
         
+        status_word, mode = d1.ask_many([
+                dict(sdo_obj=0x6041, datatype='H'),
+                dict(sdo_obj=0x6061, datatype='B')])
         
-        byte_count = {'H':2, 'B': 1, 'I': 4, 'i':4}[datatype]
-        
-        if data is not None:
-            data_bytes = struct.pack(f'<{datatype}', data) # little endian (<)
-            data_len = len(data_bytes)
-        else:
-            data_bytes = bytearray([])
-            data_len = 0
+        Writes of CACHEABLE objects whose value is already in od_cache are
+        skipped (result None). A Data Telegram Error in response to a read
+        or a CACHEABLE write raises DryveD1SDOError (after the whole batch
+        is collected).
+        """
+        results = [None]*len(requests)
+        index = []
+        keys = []
+        sdo_requests = []
+        decoders = []
+        for i, req in enumerate(requests):
+            write = bool(req.get('write', False))
+            sdo_obj = req.get('sdo_obj', 0x6041)
+            sub_index = req.get('sub_index', 0)
+            data = req.get('data')
+            codec = sdo_codec(write, sdo_obj, sub_index, req.get('datatype', 'H'))
+            key = None
+            if write and sdo_obj == 0x6060:
+                # mode of operation is only confirmed when 6061h reads it back
+                self.od_cache.pop((0x6061, 0), None)
+            if self.use_cache and (sdo_obj, sub_index) in self.CACHEABLE:
+                key = (sdo_obj, sub_index)
+                if write and key in self.od_cache and self.od_cache[key] == data:
+                    self.cache_skips += 1
+                    continue
+            index.append(i)
+            keys.append(key)
+            sdo_requests.append((codec, data))
+            # reads expect data and cached values must be confirmed: a Data
+            # Telegram Error raises DryveD1SDOError instead of giving None
+            decoders.append(codec.decode if write and key is None else codec.decode_checked)
 
-        sdo_obj_MSB = sdo_obj >> 8
-        sdo_obj_LSB = sdo_obj & 0x00FF
-        
-        telegram = bytearray([
-            0,0, # 0,1 # transaction identifier (leave at zero for a single controller on the bus
-            0,0, # 2,3 # Protocol Identifier (0,0) = Modbus
-            0,data_len+13, # 4,5 # Length of rest of telegram 
-            0, # 6 # Unit Identifier (not used)
-            0x2B, # Function Code Modbus TCPO Gateway (CANopen) = 0x2B (43)
-            0x0D, # MEI type
-            (0,1)[bool(write)], 0, # Protocol option fields / Protocol control Read = 0, Write=1
-            0, # Node Id
-            sdo_obj_MSB, sdo_obj_LSB, # SDO Object (ex statusword=0x6041, controlword=0x6042)
-            sub_index, # SDO Objects Sub Index
-            0, 0, # Starting address (Don't user)
-            0, # SDO object ( Don't use)
-            byte_count, # 1-4 Byte count detail depending the SDO object in byte 12 and 13. 
-            ])
-        telegram =  telegram + data_bytes
+        if not sdo_requests:
+            return results
+        connection_id = self.connection_id
+        outcomes, latencies = self._transfer(sdo_requests, decoders)
+        if (self.auto_reconnect and not getattr(self._local, 'restoring', False) and not self.closed
+                and any(isinstance(err, DryveD1ConnectionError) for value, err in outcomes)):
+            self.reconnect(connection_id)
+            if not any(codec.write for codec, data in sdo_requests):
+                # reads are safe to repeat, writes are left to the caller
+                outcomes, latencies = self._transfer(sdo_requests, decoders)
 
-        resp = self.ask_telegram(telegram)
-        
-        assert resp[0:3] == telegram[0:3] # id and a protocol should match
-        
-        if resp[7] != telegram[7]:
-            # Data Telegram Error
-            print(f"Data Telegram Error {resp[7]=:02X} {telegram[7]=:02X}")
-            print(f"{resp[8]=:02X}")
-            
-        
-        resp_data = resp[19:]
-        x = None
-        if len(resp_data)>0:
-            x = struct.unpack(f'<{datatype}', resp_data)[0]       
-        return x
+        metrics = self.metrics
+        first_err = None
+        for i, key, (codec, data), (value, err), dt in zip(
+                index, keys, sdo_requests, outcomes, latencies):
+            if metrics is not None:
+                metrics.record_request((codec.sdo_obj, codec.sub_index), dt, err is not None)
+            if codec.sdo_obj == 0x6041 and err is None:
+                self.last_status_word = value
+            results[i] = value
+            if err is not None:
+                if key is not None:
+                    self.od_cache.pop(key, None)
+                if first_err is None:
+                    first_err = err
+            elif key is not None:
+                # confirmed by the controller
+                self.od_cache[key] = data if codec.write else value
+        if first_err is not None:
+            raise first_err
+        return results
+
+    def _transfer(self, sdo_requests, decoders):
+        # send and collect, returns list of (result, exception) and latencies
+        if self.pipeline:
+            t0 = time.perf_counter()
+            try:
+                outcomes = self._collect(self.send_sdo_requests(sdo_requests, decoders))
+            except DryveD1ConnectionError as err:
+                outcomes = [(None, err)]*len(sdo_requests)
+            # the whole batch is one round-trip
+            return outcomes, [time.perf_counter() - t0]*len(outcomes)
+        outcomes = []
+        latencies = []
+        for sdo_request, decoder in zip(sdo_requests, decoders):
+            t0 = time.perf_counter()
+            try:
+                outcomes.extend(self._collect(self.send_sdo_requests([sdo_request], [decoder])))
+            except DryveD1ConnectionError as err:
+                outcomes.append((None, err))
+            latencies.append(time.perf_counter() - t0)
+            err = outcomes[-1][1]
+            if isinstance(err, DryveD1ConnectionError):
+                # same for the rest, without a timeout each
+                n = len(sdo_requests) - len(outcomes)
+                outcomes.extend([(None, err)]*n)
+                latencies.extend([0.0]*n)
+                break
+        return outcomes, latencies
+
+    def invalidate_cache(self):
+        "forget all cached configuration values (reconnect, fault, ...)"
+        self.od_cache.clear()
+
+    def read_status_mode_position(self):
+        """
+        Status, mode of operation and actual position in a single pipelined
+        request cycle. Returns (status dict, mode, position)
+        """
+        x, mode, pos = self.ask_many([
+            dict(sdo_obj=0x6041, sub_index=0, datatype='H'),
+            dict(sdo_obj=0x6061, sub_index=0, datatype='B'),
+            dict(sdo_obj=0x6064, sub_index=0, datatype='i'),
+            ])
+        if x & 0x08: # Fault, drive parameters may have changed
+            self.invalidate_cache()
+        return self.decode_status(x), mode, pos
 
 
     def read_status(self):
         
         x = self.ask(write=False, sdo_obj=0x6041, sub_index=0,datatype='H')
-        
-        status = {
-            'ms':  (x >>14) & 0b11, # Manufacturer Specific
-            'oms': (x >>12) & 0b11, # Operating mode specific
-            'ila': (x >>11) & 0b01, # Internal Limit Active
-            'tr':  (x >>10) & 0b01, # Target Reached
-            'rm':  (x >> 9) & 0b01, # Remote (Enable switch DI7)
-            'ms8': (x >> 8) & 0b01, # Manufacturer Specific
-            'w' :  (x >> 7) & 0b01, # Warning
-            'sod': (x >> 6) & 0b01, # Switch on Disabled
-            'qs':  (x >> 5) & 0b01, # Quick Stop
-            've':  (x >> 4) & 0b01, # Voltage Enable
-            'f':   (x >> 3) & 0b01, # Fault
-            'oe':  (x >> 2) & 0b01, # Operation Enabled
-            'so':  (x >> 1) & 0b01, # Switched On
-            'rtso':(x >> 0) & 0b01, # Ready to Switch On
-            }
-        #print(status)
-        return status
+        if x & 0x08: # Fault, drive parameters may have changed
+            self.invalidate_cache()
+        return self.decode_status(x)
+
+    @staticmethod
+    def decode_status(x):
+        "decode statusword 6041h, returns DryveStatus (indexable like a dict: status['tr'])"
+        return DryveStatus.from_word(x)
     
     def write_controlword(self, so,ev,qs, eo, oms=0, fr=0, h=0, oms9=0, r=0, ms=0):
         data_word = (
@@ -171,42 +1132,95 @@ class IgusDryveD1(object):
         resp = self.write_controlword(so=0, ev=0, qs=0, eo=0, oms=0, fr=0, h=1, oms9=0)
         return resp
     
+    def wait_for(self, condition, timeout, name, read_func=None, expected_duration=None,
+                 interrupt=None):
+        """
+        Poll read_func() (default read_status) until condition(value) is true
+        and return that value. The interval between polls starts at
+        poll_interval and grows by poll_backoff up to poll_interval_max.
+        
+        expected_duration (s): when the awaited event is expected to happen,
+        eg from estimate_move_time(). Until shortly before then polls are
+        sparse, then dense again.
+        
+        interrupt: optional threading.Event, when set the wait stops with
+        DryveD1Interrupted (eg cancelled moves, see igus_dryveD1_motion)
+        
+        The number of polls and time taken is kept in last_wait_polls and
+        last_wait_time. Raises IOError after timeout.
+        """
+        if read_func is None:
+            read_func = self.read_status
+        t0 = time.monotonic()
+        deadline = t0 + timeout
+        dense_from = t0
+        if expected_duration is not None:
+            dense_from = t0 + expected_duration - self.arrival_margin
+        interval = self.poll_interval
+        polls = 0
+        timed_out = False
+        try:
+            while True:
+                value = read_func()
+                polls += 1
+                if condition(value):
+                    return value
+                if interrupt is not None and interrupt.is_set():
+                    raise DryveD1Interrupted(f"{name} interrupted")
+                now = time.monotonic()
+                if now >= deadline:
+                    timed_out = True
+                    raise IOError(f"timeout occurred in {name}")
+                if now < dense_from:
+                    dt = min(dense_from - now, self.poll_interval_max)
+                else:
+                    dt = interval
+                    interval = min(interval*self.poll_backoff, self.poll_interval_max)
+                if interrupt is not None:
+                    interrupt.wait(min(dt, deadline - now))
+                else:
+                    time.sleep(min(dt, deadline - now))
+        finally:
+            self.last_wait_polls = polls
+            self.last_wait_time = time.monotonic() - t0
+            if self.metrics is not None:
+                self.metrics.record_wait(name, self.last_wait_time, polls, timed_out)
+            if self.debug:
+                print(f"{name}: {polls} polls in {self.last_wait_time:.3f} s")
+
+    @staticmethod
+    def estimate_move_time(distance, speed, acc):
+        """
+        Duration of a trapezoidal profile move (s), in the same units as the
+        drive parameters: distance, profile velocity (/s), profile acceleration (/s2).
+        Returns None if the profile is not known
+        """
+        d = abs(distance)
+        if not speed or not acc or speed <= 0 or acc <= 0:
+            return None
+        if d >= speed**2 / acc:
+            # reaches profile velocity: accel + constant speed + decel
+            return d/speed + speed/acc
+        # triangular profile
+        return 2*(d/acc)**0.5
+
     def write_and_wait_shutdown(self, timeout=1.0):
         self.write_controlword(so=0, ev=1, qs=1, eo=0)
-        t0 = time.monotonic()
-        while time.monotonic() - t0 < timeout:
-            status = self.read_status()
-            print(status)
-            # Make sure switch on disabled off
-            # wait until Ready to Switch On
-            if status['rtso'] and (not status['sod']): 
-                print("shutdown success")
-                return
-        raise IOError("timeout occurred in write_and_wait_shutdown")
+        # Make sure switch on disabled off
+        # wait until Ready to Switch On
+        self.wait_for(lambda status: status['rtso'] and (not status['sod']),
+                      timeout, "write_and_wait_shutdown")
+        print("shutdown success")
     
     def write_and_wait_switch_on(self, timeout=1.0):
         self.write_controlword(so=1, ev=1, qs=1, eo=0)
-        t0 = time.monotonic()
-        while time.monotonic() - t0 < timeout:
-            status = self.read_status()
-            # Make sure switch on disabled off
-            # wait until Ready to Switch On
-            if status['so']: 
-                print("switch on success")
-                return
-        raise IOError("timeout occurred in write_and_wait_switch_on")
+        self.wait_for(lambda status: status['so'], timeout, "write_and_wait_switch_on")
+        print("switch on success")
     
     def write_and_wait_operation_enable(self, timeout=1.0):
         self.write_controlword(so=1, ev=1, qs=1, eo=1)
-        t0 = time.monotonic()
-        while time.monotonic() - t0 < timeout:
-            status = self.read_status()
-            # Make sure switch on disabled off
-            # wait until Ready to Switch On
-            if status['oe']: 
-                print("op enable success")
-                return
-        raise IOError("timeout occurred in write_and_wait_operation_enable")
+        self.wait_for(lambda status: status['oe'], timeout, "write_and_wait_operation_enable")
+        print("op enable success")
 
     def read_SI_unit(self):
         # TODO Does not work with current 2020 firmware
@@ -234,179 +1248,259 @@ class IgusDryveD1(object):
         return x
     
     def write_mode(self, mode):
+        # mode is not confirmed until read back
+        self.od_cache.pop((0x6061, 0), None)
         x = self.ask(write=True, sdo_obj=0x6060, sub_index=0, datatype='B', data=mode)
+        self.mode_writes += 1
         print('write_mode', mode, x)
 
     def write_mode_and_wait(self, mode, timeout=1.0):
+        if self.use_cache and self.od_cache.get((0x6061, 0)) == mode:
+            # already confirmed in this mode
+            self.cache_skips += 1
+            return
+        self.od_cache.pop((0x6061, 0), None)
         x = self.ask(write=True, sdo_obj=0x6060, sub_index=0, datatype='B', data=mode)
-        t0 = time.monotonic()
-        while (time.monotonic() - t0) < timeout:
-            current_mode = self.read_mode()
-            print(f"{current_mode=} vs {mode=}")
-            if current_mode == mode:
-                print("mode change success")
-                return
-        raise IOError("timeout occurred during write_mode_and_wait")
+        self.mode_writes += 1
+        self.wait_for(lambda current_mode: current_mode == mode,
+                      timeout, "write_mode_and_wait", read_func=self.read_mode)
+        print("mode change success")
     
-    def read_feed_constant(self):
-        "Feed_constant_Feed:"
-        return self.ask(write=False, sdo_obj=0x6092, sub_index=1, datatype='I')
-    
-    def write_feed_constant(self, fc):
+    # plain read_<name> / write_<name> accessors (read_actual_position,
+    # write_profile_velocity, read_homing_method, ...) are generated from
+    # OBJECT_DICTIONARY below the class
+
+    def read_many(self, names):
         """
-        Feed_constant_Feed
-        rate in units / feed_revs ?
+        Read several OBJECT_DICTIONARY objects in one pipelined request,
+        returns dict name --> value, eg
+        
+        d1.read_many(['actual_position', 'actual_velocity', 'statusword'])
         """
-        self.ask(write=True, sdo_obj=0x6092, sub_index=1, datatype='I', data=fc)
-    
-    def read_feed_revs(self):
-        "Feed_constant_Shaft_revolutions"
-        return self.ask(write=False, sdo_obj=0x6092, sub_index=2, datatype='I')
-
-    def write_feed_revs(self, revs=1):
-        "Feed_constant_Shaft_revolutions"
-        self.ask(write=True, sdo_obj=0x6092, sub_index=2, datatype='I', data=revs)
-        #
-        # print("Feed_constant_Feed:", self.ask(write=False, sdo_obj=0x6092, sub_index=1, datatype='I'))
-        # print("write Feed_constant_Feed:", self.ask(write=True, sdo_obj=0x6092, sub_index=1, datatype='I', data=6000))
-        # print("Feed_constant_Feed:", self.ask(write=False, sdo_obj=0x6092, sub_index=1, datatype='I'))
-        # print("Feed_constant_Shaft_revolutions:", self.ask(write=False, sdo_obj=0x6092, sub_index=2, datatype='I'))
-        # print("write Feed_constant_Shaft_revolutions:", self.ask(write=True, sdo_obj=0x6092, sub_index=2, datatype='I', data=1))
-        # print("Feed_constant_Shaft_revolutions:", self.ask(write=False, sdo_obj=0x6092, sub_index=2, datatype='I'))
+        objs = [OBJECT_DICTIONARY[name] for name in names]
+        values = self.ask_many([dict(sdo_obj=o.index, sub_index=o.sub, datatype=o.datatype)
+                                for o in objs])
+        return dict(zip(names, values))
 
-
-    def read_target_position(self):
-        """Target Position 607Ah"""
-        resp = self.ask(write=False, sdo_obj=0x607A, sub_index=0, datatype='i')
-        print("read_target_position", resp)
-        return resp
-    def write_target_position(self, pos):
-        """Target Position 607Ah"""
-        return self.ask(write=True, sdo_obj=0x607A, sub_index=0, datatype='i', data=pos)
-
-    def read_actual_position(self):
-        """Actual Position 6064h"""
-        return self.ask(write=False, sdo_obj=0x6064, sub_index=0, datatype='i')
-    
-    
-    def read_profile_velocity(self):
-        # 6081h Profile Velocity
-        return self.ask(write=False, sdo_obj=0x6081, sub_index=0, datatype='I')
-    def write_profile_velocity(self, vel):
-        # 6081h Profile Velocity
-        return self.ask(write=True, sdo_obj=0x6081, sub_index=0, datatype='I', data=vel)
-
-    def read_profile_acc(self):
-        # 6083h Profile Acceleration
-        return self.ask(write=False, sdo_obj=0x6083, sub_index=0, datatype='I')
-    def write_profile_acc(self, acc):
-        # 6083h Profile Acceleration
-        return self.ask(write=True, sdo_obj=0x6083, sub_index=0, datatype='I', data=acc)
-
-    def read_home_velocity(self):
-        # 6099h_01h Search Velocity for Switch
-        return self.ask(write=False, sdo_obj=0x6099, sub_index=1, datatype='I')
-    def write_home_velocity(self, speed):
-        # 6099h_01h Search Velocity for Switch
-        return self.ask(write=True, sdo_obj=0x6099, sub_index=1, datatype='I', data=speed)
-
-    def read_home_velocity2(self):
-        # 6099h_01h Search Velocity for Switch
-        return self.ask(write=False, sdo_obj=0x6099, sub_index=2, datatype='I')
-    def write_home_velocity2(self, speed2):
-        # 6099h_01h Search Velocity for Switch
-        return self.ask(write=True, sdo_obj=0x6099, sub_index=2, datatype='I', data=speed2)
-
-    def read_home_acc(self):
-        # 609Ah Homing Acceleration
-        return self.ask(write=False, sdo_obj=0x609A, sub_index=0, datatype='I')
-    def write_home_acc(self, acc):
-        # 609Ah Homing Acceleration
-        return self.ask(write=True, sdo_obj=0x609A, sub_index=0, datatype='I', data=acc)
+    def write_many(self, values):
+        """
+        Write several OBJECT_DICTIONARY objects, dict name --> value, in one
+        pipelined request (in dict order). Unchanged cacheable values are
+        skipped, see ask_many.
+        """
+        requests = []
+        for name, value in values.items():
+            o = OBJECT_DICTIONARY[name]
+            if o.access == 'ro':
+                raise ValueError(f"{name} ({o.index:04X}h) is read only")
+            requests.append(dict(write=True, sdo_obj=o.index, sub_index=o.sub,
+                                 datatype=o.datatype, data=value))
+        self.ask_many(requests)
 
     def trigger_move(self):
+        # separate round-trips: the drive samples 6040h once per control
+        # cycle, the low phase of bit 4 must be confirmed before the rising edge
         # Enable Operation to set bit 4 of the controlword to low again; see manual chapter "Controlword"
         self.write_controlword(so=1, ev=1, qs=1, eo=1, oms=0)
         # Send Telegram(TX) Write Controlword 6040h Command: Start Movement; rising edge of bit 4 (oms)
         self.write_controlword(so=1, ev=1, qs=1, eo=1, oms=1)
+        self.move_triggers += 1
         
         
     def halt_motion(self):
         self.write_controlword(so=1, ev=1,qs=1, eo=1, h=1)
+
+    @staticmethod
+    def _check_interrupt(interrupt, name):
+        if interrupt is not None and interrupt.is_set():
+            raise DryveD1Interrupted(f"{name} interrupted")
         
     def start_home(self):
         self.write_mode_and_wait(mode=6, timeout=0.5)
         self.trigger_move()
 
         
-    def run_home_and_wait(self, speed, acc, speed2=None, timeout=10.0):
+    def run_home_and_wait(self, speed, acc, speed2=None, timeout=10.0, interrupt=None):
+        "returns the final status, oms == 0b10 is a homing error"
         print("======run_home_and_wait")
         if speed2 is None:
             speed2 = speed
         self.write_mode_and_wait(mode=6, timeout=0.5)
-        # 6099h_01h Search Velocity for Switch
-        self.ask(write=True, sdo_obj=0x6099, sub_index=1, datatype='I', data=speed)
-        # sub_index 2 defines the maximum velocity that is used when the limit switch was 
-        # found and the reference point is set. Subindex 2 is not used when the encoder index 
-        # is used to determine the zero-position.
-        self.ask(write=True, sdo_obj=0x6099, sub_index=2, datatype='I', data=speed2)
-        # 609Ah Homing Acceleration
-        self.ask(write=True, sdo_obj=0x609A, sub_index=0, datatype='I', data=acc)
+        self.ask_many([
+            # 6099h_01h Search Velocity for Switch
+            dict(write=True, sdo_obj=0x6099, sub_index=1, datatype='I', data=speed),
+            # sub_index 2 defines the maximum velocity that is used when the limit switch was 
+            # found and the reference point is set. Subindex 2 is not used when the encoder index 
+            # is used to determine the zero-position.
+            dict(write=True, sdo_obj=0x6099, sub_index=2, datatype='I', data=speed2),
+            # 609Ah Homing Acceleration
+            dict(write=True, sdo_obj=0x609A, sub_index=0, datatype='I', data=acc),
+            ])
         
         time.sleep(0.1)
         
+        # a halt sent before this point would be undone by trigger_move()
+        self._check_interrupt(interrupt, "run_home_and_wait")
         self.trigger_move()
 
         time.sleep(0.2)
 
         # Check Statusword for signal referenced 
-        t0 = time.monotonic()
-        while time.monotonic() - t0 < timeout:
-            status = self.read_status()
-            if status['oms'] == 0b00 and status['tr'] == 0:
-                print("homing is being executed")
-
-            if status['oms'] == 0b00 and status['tr'] == 1:
-                print("homing is interrupted or not yet started")
-            
-            if status['oms'] == 0b10:
-                if status['tr']:
-                    print('homing error, vel = 0')
-                else:
-                    print('homing error, vel != 0')
-                return
-            
-            if status['oms'] == 0b01 and status['tr'] ==1: # Homing Attained and Target Reached
-                print("homing success")
-                return
-        raise IOError("timeout occurred in run_home_and_wait")
+        # oms == 0b10: homing error, oms == 0b01 and tr: Homing Attained and Target Reached
+        status = self.wait_for(
+            lambda status: status['oms'] == 0b10 or (status['oms'] == 0b01 and status['tr']),
+            timeout, "run_home_and_wait", interrupt=interrupt)
+        if status['oms'] == 0b10:
+            if status['tr']:
+                print('homing error, vel = 0')
+            else:
+                print('homing error, vel != 0')
+            return status
+        print("homing success")
+        return status
 
 
+    def setup_abs_move(self, pos, speed, acc):
+        """Profile position mode, velocity, acceleration and target,
+        the move starts with trigger_move(). Returns the actual position"""
+        # Set mode to Profile Position Mode (1)
+        self.write_mode_and_wait(mode=1, timeout=0.1)
 
+        _, _, _, actual_pos = self.ask_many([
+            # 6081h Profile Velocity
+            dict(write=True, sdo_obj=0x6081, sub_index=0, datatype='I', data=speed),
+            # 6083h Profile Acceleration
+            dict(write=True, sdo_obj=0x6083, sub_index=0, datatype='I', data=acc),
+            # Send Telegram(TX) Write Target Position 607Ah "Write Value"
+            dict(write=True, sdo_obj=0x607A, sub_index=0, datatype='i', data=pos),
+            # 6064h Actual Position, start of the move
+            dict(write=False, sdo_obj=0x6064, sub_index=0, datatype='i'),
+            ])
+        return actual_pos
 
+    def wait_target_reached(self, timeout=10.0, expected_duration=None, interrupt=None):
+        return self.wait_for(lambda status: status['tr'], timeout, "wait_target_reached",
+                             expected_duration=expected_duration, interrupt=interrupt)
 
-    def go_abs_pos_and_wait(self, pos, speed, acc, timeout=10.0):
-        # Set mode to Profile Position Mode (1)
-        self.write_mode_and_wait(mode=1, timeout=0.1)
+    def go_abs_pos_and_wait(self, pos, speed, acc, timeout=10.0, interrupt=None):
+        "returns the final status"
+        start_pos = self.setup_abs_move(pos, speed, acc)
+        # a halt sent before this point would be undone by trigger_move()
+        self._check_interrupt(interrupt, "go_abs_pos_and_wait")
+        self.trigger_move()
+        # wait_for raises the timeout, connection and SDO errors as they are
+        status = self.wait_target_reached(timeout,
+            expected_duration=self.estimate_move_time(pos - start_pos, speed, acc),
+            interrupt=interrupt)
+        print("go_abs_pos_and_wait success")
+        return status
 
-        # 6081h Profile Velocity
-        self.ask(write=True, sdo_obj=0x6081, sub_index=0, datatype='I', data=speed)
+    def position_monitor(self, rate=None):
+        """
+        The PositionMonitor of this controller (created on first use), one
+        shared polling stream for all position threshold / window callbacks:
         
-        # 6083h Profile Acceleration
-        self.ask(write=True, sdo_obj=0x6083, sub_index=0, datatype='I', data=acc)
+        d1.position_monitor().add_threshold(5000, callback)
         
-        # Send Telegram(TX) Write Target Position 607Ah "Write Value"
-        self.ask(write=True, sdo_obj=0x607A, sub_index=0, datatype='i', data=pos)
+        rate: position samples per second (default 500)
+        """
+        if self._position_monitor is None:
+            from ScopeFoundryHW.igus_dryve.igus_dryveD1_triggers import PositionMonitor
+            self._position_monitor = PositionMonitor(self)
+        if rate is not None:
+            self._position_monitor.rate = rate
+        return self._position_monitor
+
+    def state_publisher(self):
+        """
+        The StatePublisher of this controller (created and started on first
+        use): one poller whose latest AxisSnapshot (status, mode, position)
+        every consumer can read without I/O:
         
-        self.trigger_move()
+        snap = d1.state_publisher().latest()
+        """
+        if self._state_publisher is None:
+            from ScopeFoundryHW.igus_dryve.igus_dryveD1_state import StatePublisher
+            self._state_publisher = StatePublisher(self)
+        self._state_publisher.start()
+        return self._state_publisher
 
+    def run_position_sequence(self, points, speed, acc, dwell=0.0, callback=None, timeout=10.0):
+        """
+        Visit a sequence of absolute positions (eg raster scan points) in
+        Profile Position mode. Mode, velocity and acceleration are set once,
+        then for each point the target position and controlword bit 4 low
+        go out in one pipelined batch followed by the rising edge, and the
+        point is done when the statusword shows set-point acknowledge
+        (bit 12) and target reached (bit 10).
+        
+        callback(i, pos, status) is called at each point once it is reached,
+        return False from it to stop the sequence. dwell (s) is waited after
+        the callback. timeout (s) applies to each point.
+        
+        Returns timing dict with per-point lists 't_start', 't_reached' (time.monotonic),
+        'polls' and overall 'duration' and 'points_per_second' (all empty /
+        0 for no points). Also kept in self.last_sequence_timing
+        """
+        timing = dict(positions=[], t_start=[], t_reached=[], polls=[])
+        self.last_sequence_timing = timing
+        if len(points) == 0:
+            timing.update(duration=0.0, points_per_second=0.0)
+            return timing
+        prev_pos = self.setup_abs_move(points[0], speed, acc)
         t0 = time.monotonic()
-        while time.monotonic() - t0 < timeout:
-            status = self.read_status()
-            if status['tr']:
-                print("go_abs_pos_and_wait success")
-                return
-        raise IOError("timeout occurred in go_abs_pos_and_wait")
+        for i, pos in enumerate(points):
+            t_start = time.monotonic()
+            self.ask_many([
+                # 607Ah Target Position
+                dict(write=True, sdo_obj=0x607A, sub_index=0, datatype='i', data=pos),
+                # bit 4 low, confirmed before the rising edge (see trigger_move)
+                dict(write=True, sdo_obj=0x6040, sub_index=0, datatype='H', data=0b0000_1111),
+                ])
+            # bit 4 high: new set-point
+            self.write_controlword(so=1, ev=1, qs=1, eo=1, oms=1)
+            self.move_triggers += 1
+            status = self.wait_for(
+                lambda status: status['tr'] and (status['oms'] & 0b01),
+                timeout, "run_position_sequence",
+                expected_duration=self.estimate_move_time(pos - prev_pos, speed, acc))
+            timing['positions'].append(pos)
+            timing['t_start'].append(t_start)
+            timing['t_reached'].append(time.monotonic())
+            timing['polls'].append(self.last_wait_polls)
+            prev_pos = pos
+            if callback is not None and callback(i, pos, status) is False:
+                break
+            if dwell > 0:
+                time.sleep(dwell)
+        timing['duration'] = time.monotonic() - t0
+        timing['points_per_second'] = len(timing['positions']) / timing['duration']
+        if self.debug:
+            print(f"run_position_sequence: {len(timing['positions'])} points, "
+                  f"{timing['points_per_second']:.1f} points/s")
+        return timing
+
+def _od_reader(obj):
+    def read(self):
+        return self.ask(write=False, sdo_obj=obj.index, sub_index=obj.sub, datatype=obj.datatype)
+    read.__name__ = f"read_{obj.name}"
+    read.__doc__ = f"{obj.index:04X}h sub {obj.sub} {obj.description}"
+    return read
+
+def _od_writer(obj):
+    def write(self, value):
+        return self.ask(write=True, sdo_obj=obj.index, sub_index=obj.sub, datatype=obj.datatype,
+                        data=value)
+    write.__name__ = f"write_{obj.name}"
+    write.__doc__ = f"{obj.index:04X}h sub {obj.sub} {obj.description}"
+    return write
+
+# hand written methods (read_mode, write_mode, write_controlword, ...) are kept
+for _obj in OBJECT_DICTIONARY.values():
+    if _obj.access in ('ro', 'rw') and not hasattr(IgusDryveD1, f"read_{_obj.name}"):
+        setattr(IgusDryveD1, f"read_{_obj.name}", _od_reader(_obj))
+    if _obj.access in ('wo', 'rw') and not hasattr(IgusDryveD1, f"write_{_obj.name}"):
+        setattr(IgusDryveD1, f"write_{_obj.name}", _od_writer(_obj))
 
 
 if __name__ == '__main__':
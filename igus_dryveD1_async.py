@@ -0,0 +1,292 @@
+"""
+asyncio client for the igus dryve D1, same API as IgusDryveD1 but every
+controller access is a coroutine. One event loop can drive many
+controllers at once:
+
+    async def main():
+        d1 = await AsyncIgusDryveD1.open("192.168.0.10")
+        d2 = await AsyncIgusDryveD1.open("192.168.0.15")
+        await asyncio.gather(
+            d1.run_home_and_wait(speed=1000, acc=1000, timeout=20),
+            d2.run_home_and_wait(speed=2000, acc=1000, timeout=20))
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import time
+
+from ScopeFoundryHW.igus_dryve.igus_dryveD1 import IgusDryveD1, DryveD1ConnectionError, sdo_codec
+
+
+class AsyncIgusDryveD1(object):
+
+    def __init__(self, ip_address, port=502, debug=False, poll_interval=0.005):
+        self.debug = debug
+        self.ip_address = ip_address
+        self.port = port
+        # sleep between status polls in the *_and_wait coroutines
+        self.poll_interval = poll_interval
+
+        self.reader = None
+        self.writer = None
+        self._rx_task = None
+        self._pending = {} # transaction id --> (codec, future)
+        self._next_tid = 0
+        # why the connection is unusable (lost or closed), raised by ask()
+        self._error = DryveD1ConnectionError("not connected")
+
+    @classmethod
+    async def open(cls, ip_address, port=502, initialize=True, debug=False, **kwargs):
+        d1 = cls(ip_address, port, debug=debug, **kwargs)
+        await d1.connect()
+        if initialize:
+            await d1.initialize()
+        return d1
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.ip_address, self.port)
+        self._error = None
+        self._rx_task = asyncio.get_running_loop().create_task(self._rx_loop())
+        if self.debug:
+            print('Socket created')
+
+    async def close(self):
+        if self._rx_task is not None:
+            self._rx_task.cancel()
+            self._rx_task = None
+        self._fail_pending(DryveD1ConnectionError("connection to dryve D1 closed"))
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+    async def _rx_loop(self):
+        try:
+            while True:
+                # MBAP header: transaction id (2), protocol id (2), length of rest (2)
+                header = await self.reader.readexactly(6)
+                length = (header[4] << 8) | header[5]
+                frame = header + await self.reader.readexactly(length)
+                if self.debug:
+                    print(f"    <--{frame.hex()}")
+                tid = (frame[0] << 8) | frame[1]
+                codec, fut = self._pending.pop(tid, (None, None))
+                if fut is None or fut.done():
+                    continue
+                try:
+                    # a read without data raises DryveD1SDOError, as in IgusDryveD1.ask_many
+                    decode = codec.decode if codec.write else codec.decode_checked
+                    fut.set_result(decode(frame))
+                except Exception as err:
+                    fut.set_exception(err)
+        except Exception as err:
+            # connection lost, fail everything that is still waiting and
+            # every later ask()
+            if isinstance(err, asyncio.IncompleteReadError):
+                err = DryveD1ConnectionError("connection closed by dryve D1")
+            elif isinstance(err, OSError) and not isinstance(err, DryveD1ConnectionError):
+                err = DryveD1ConnectionError(f"receive from dryve D1 failed: {err}")
+            self._fail_pending(err)
+
+    def _fail_pending(self, err):
+        self._error = err
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for codec, fut in pending:
+            if not fut.done():
+                fut.set_exception(err)
+
+    async def ask(self, write=False, sdo_obj=0x6041, sub_index=0, datatype='H', data=None):
+        if self._error is not None:
+            # nothing would ever answer
+            raise self._error
+        codec = sdo_codec(bool(write), sdo_obj, sub_index, datatype)
+        self._next_tid = (self._next_tid + 1) & 0xFFFF
+        tid = self._next_tid
+        telegram = codec.build(data, tid)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[tid] = (codec, fut)
+        if self.debug:
+            print(f"ask -->{telegram.hex()}")
+        self.writer.write(telegram)
+        return await fut
+
+    async def ask_many(self, requests):
+        """all requests are in flight at once, see IgusDryveD1.ask_many"""
+        return await asyncio.gather(*[self.ask(**req) for req in requests])
+
+    async def initialize(self):
+        await self.write_status_reset()
+        # Make sure enable switch is on
+        assert (await self.read_status())['rm'] == 1
+
+        # clear Faults and halt motion
+        await self.write_controlword(so=0, ev=0, qs=0, eo=0, oms=0, fr=1, h=1)
+
+        await self.write_and_wait_shutdown(timeout=1)
+        await self.write_and_wait_switch_on()
+        await self.write_and_wait_operation_enable()
+
+    async def wait_for_status(self, condition, timeout, name):
+        """poll the statusword until condition(status) is true, returns status"""
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < timeout:
+            status = await self.read_status()
+            if condition(status):
+                return status
+            await asyncio.sleep(self.poll_interval)
+        raise IOError(f"timeout occurred in {name}")
+
+    async def read_status_mode_position(self):
+        x, mode, pos = await self.ask_many([
+            dict(sdo_obj=0x6041, sub_index=0, datatype='H'),
+            dict(sdo_obj=0x6061, sub_index=0, datatype='B'),
+            dict(sdo_obj=0x6064, sub_index=0, datatype='i'),
+            ])
+        return IgusDryveD1.decode_status(x), mode, pos
+
+    async def read_status(self):
+        x = await self.ask(write=False, sdo_obj=0x6041, sub_index=0, datatype='H')
+        return IgusDryveD1.decode_status(x)
+
+    async def write_controlword(self, so, ev, qs, eo, oms=0, fr=0, h=0, oms9=0, r=0, ms=0):
+        data_word = (
+            (so  << 0) +  # Switch On
+            (ev  << 1) +  # Enable Voltage
+            (qs  << 2) +  # Quick Stop
+            (eo  << 3) +  # Enable Operation
+            (oms << 4) +  # Operating Mode Specific (3 bits)
+            (fr  << 7) +  # Fault Reset
+            (h   << 8) +  # Halt
+            (oms9<< 9) +  # Operating Mode Specific (profile position only)
+            (r   <<10) +  # Reserved
+            (ms  <<11)  ) # Manufacturer Specific (5 bits)
+        return await self.ask(write=True, sdo_obj=0x6040, sub_index=0, datatype='H', data=data_word)
+
+    async def write_status_reset(self):
+        return await self.write_controlword(so=0, ev=0, qs=0, eo=0, oms=0, fr=0, h=1, oms9=0)
+
+    async def write_and_wait_shutdown(self, timeout=1.0):
+        await self.write_controlword(so=0, ev=1, qs=1, eo=0)
+        # wait until Ready to Switch On and switch on disabled off
+        await self.wait_for_status(lambda s: s['rtso'] and not s['sod'],
+                                   timeout, 'write_and_wait_shutdown')
+
+    async def write_and_wait_switch_on(self, timeout=1.0):
+        await self.write_controlword(so=1, ev=1, qs=1, eo=0)
+        await self.wait_for_status(lambda s: s['so'], timeout, 'write_and_wait_switch_on')
+
+    async def write_and_wait_operation_enable(self, timeout=1.0):
+        await self.write_controlword(so=1, ev=1, qs=1, eo=1)
+        await self.wait_for_status(lambda s: s['oe'], timeout, 'write_and_wait_operation_enable')
+
+    async def read_mode(self):
+        # Mode of operation read 0x6061, see IgusDryveD1.read_mode
+        return await self.ask(write=False, sdo_obj=0x6061, sub_index=0, datatype='B')
+
+    async def write_mode(self, mode):
+        return await self.ask(write=True, sdo_obj=0x6060, sub_index=0, datatype='B', data=mode)
+
+    async def write_mode_and_wait(self, mode, timeout=1.0):
+        await self.write_mode(mode)
+        t0 = time.monotonic()
+        while (time.monotonic() - t0) < timeout:
+            if await self.read_mode() == mode:
+                return
+            await asyncio.sleep(self.poll_interval)
+        raise IOError("timeout occurred during write_mode_and_wait")
+
+    async def read_feed_constant(self):
+        return await self.ask(write=False, sdo_obj=0x6092, sub_index=1, datatype='I')
+    async def write_feed_constant(self, fc):
+        return await self.ask(write=True, sdo_obj=0x6092, sub_index=1, datatype='I', data=fc)
+
+    async def read_feed_revs(self):
+        return await self.ask(write=False, sdo_obj=0x6092, sub_index=2, datatype='I')
+    async def write_feed_revs(self, revs=1):
+        return await self.ask(write=True, sdo_obj=0x6092, sub_index=2, datatype='I', data=revs)
+
+    async def read_target_position(self):
+        return await self.ask(write=False, sdo_obj=0x607A, sub_index=0, datatype='i')
+    async def write_target_position(self, pos):
+        return await self.ask(write=True, sdo_obj=0x607A, sub_index=0, datatype='i', data=pos)
+
+    async def read_actual_position(self):
+        return await self.ask(write=False, sdo_obj=0x6064, sub_index=0, datatype='i')
+
+    async def read_profile_velocity(self):
+        return await self.ask(write=False, sdo_obj=0x6081, sub_index=0, datatype='I')
+    async def write_profile_velocity(self, vel):
+        return await self.ask(write=True, sdo_obj=0x6081, sub_index=0, datatype='I', data=vel)
+
+    async def read_profile_acc(self):
+        return await self.ask(write=False, sdo_obj=0x6083, sub_index=0, datatype='I')
+    async def write_profile_acc(self, acc):
+        return await self.ask(write=True, sdo_obj=0x6083, sub_index=0, datatype='I', data=acc)
+
+    async def read_home_velocity(self):
+        return await self.ask(write=False, sdo_obj=0x6099, sub_index=1, datatype='I')
+    async def write_home_velocity(self, speed):
+        return await self.ask(write=True, sdo_obj=0x6099, sub_index=1, datatype='I', data=speed)
+
+    async def read_home_velocity2(self):
+        return await self.ask(write=False, sdo_obj=0x6099, sub_index=2, datatype='I')
+    async def write_home_velocity2(self, speed2):
+        return await self.ask(write=True, sdo_obj=0x6099, sub_index=2, datatype='I', data=speed2)
+
+    async def read_home_acc(self):
+        return await self.ask(write=False, sdo_obj=0x609A, sub_index=0, datatype='I')
+    async def write_home_acc(self, acc):
+        return await self.ask(write=True, sdo_obj=0x609A, sub_index=0, datatype='I', data=acc)
+
+    async def trigger_move(self):
+        # bit 4 of the controlword low, then rising edge starts the movement
+        await self.write_controlword(so=1, ev=1, qs=1, eo=1, oms=0)
+        await self.write_controlword(so=1, ev=1, qs=1, eo=1, oms=1)
+
+    async def halt_motion(self):
+        await self.write_controlword(so=1, ev=1, qs=1, eo=1, h=1)
+
+    async def start_home(self):
+        await self.write_mode_and_wait(mode=6, timeout=0.5)
+        await self.trigger_move()
+
+    async def run_home_and_wait(self, speed, acc, speed2=None, timeout=10.0):
+        if speed2 is None:
+            speed2 = speed
+        await self.write_mode_and_wait(mode=6, timeout=0.5)
+        await self.ask_many([
+            # 6099h_01h Search Velocity for Switch
+            dict(write=True, sdo_obj=0x6099, sub_index=1, datatype='I', data=speed),
+            # 6099h_02h velocity used when the limit switch was found
+            dict(write=True, sdo_obj=0x6099, sub_index=2, datatype='I', data=speed2),
+            # 609Ah Homing Acceleration
+            dict(write=True, sdo_obj=0x609A, sub_index=0, datatype='I', data=acc),
+            ])
+        await asyncio.sleep(0.1)
+        await self.trigger_move()
+        await asyncio.sleep(0.2)
+
+        # oms bits: 0b10 homing error, 0b01 + target reached: homing attained
+        status = await self.wait_for_status(
+            lambda s: s['oms'] == 0b10 or (s['oms'] == 0b01 and s['tr']),
+            timeout, 'run_home_and_wait')
+        if status['oms'] == 0b10:
+            print(f"{self.ip_address} homing error, vel {'= 0' if status['tr'] else '!= 0'}")
+        elif self.debug:
+            print("homing success")
+
+    async def go_abs_pos_and_wait(self, pos, speed, acc, timeout=10.0):
+        # Set mode to Profile Position Mode (1)
+        await self.write_mode_and_wait(mode=1, timeout=0.1)
+        await self.ask_many([
+            # 6081h Profile Velocity
+            dict(write=True, sdo_obj=0x6081, sub_index=0, datatype='I', data=speed),
+            # 6083h Profile Acceleration
+            dict(write=True, sdo_obj=0x6083, sub_index=0, datatype='I', data=acc),
+            # 607Ah Target Position
+            dict(write=True, sdo_obj=0x607A, sub_index=0, datatype='i', data=pos),
+            ])
+        await self.trigger_move()
+        await self.wait_for_status(lambda s: s['tr'], timeout, 'go_abs_pos_and_wait')
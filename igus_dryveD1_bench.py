@@ -0,0 +1,175 @@
+"""
+Benchmarks for the IgusDryveD1 driver hot path.
+
+Runs against the local simulator (default) or a real controller and
+writes the results as JSON so driver versions can be compared:
+
+    python igus_dryveD1_bench.py --output bench.json
+    python igus_dryveD1_bench.py --ip 192.168.0.10 --allow-motion --output bench_hw.json
+
+Measured:
+    ask round-trip latency (p50/p90/p99/max) and read_status polls/s
+    initialize() duration
+    go_abs_pos_and_wait moves/s
+    polls/s and latency with 1..N threads sharing one IgusDryveD1
+"""
+
+import json
+import platform
+import subprocess
+import threading
+import time
+import os
+
+from ScopeFoundryHW.igus_dryve.igus_dryveD1 import IgusDryveD1
+from ScopeFoundryHW.igus_dryve.igus_dryveD1_sim import DryveD1SimServer
+
+
+def percentiles(samples, ps=(50, 90, 99)):
+    """dict of percentiles (nearest rank), plus mean and max, of a list of samples"""
+    if not samples:
+        return {}
+    s = sorted(samples)
+    n = len(s)
+    out = {f"p{p}": s[min(n-1, int(round(p/100.0*(n-1))))] for p in ps}
+    out['mean'] = sum(s)/n
+    out['max'] = s[-1]
+    return out
+
+
+def bench_latency(d1, n=2000):
+    lat = []
+    t0 = time.perf_counter()
+    for i in range(n):
+        t = time.perf_counter()
+        d1.read_status()
+        lat.append(time.perf_counter() - t)
+    duration = time.perf_counter() - t0
+    return dict(n=n, latency_s=percentiles(lat), polls_per_s=n/duration)
+
+
+def bench_pipelined(d1, n=500):
+    "status + mode + position cycles, pipelined"
+    t0 = time.perf_counter()
+    for i in range(n):
+        d1.read_status_mode_position()
+    duration = time.perf_counter() - t0
+    return dict(n=n, cycles_per_s=n/duration, cycle_s=duration/n)
+
+
+def bench_initialize(d1, n=5):
+    times = []
+    for i in range(n):
+        t = time.perf_counter()
+        d1.initialize()
+        times.append(time.perf_counter() - t)
+    return dict(n=n, initialize_s=percentiles(times))
+
+
+def bench_moves(d1, n=20, distance=1000, speed=50000, acc=500000):
+    start = d1.read_actual_position()
+    t0 = time.perf_counter()
+    polls = []
+    for i in range(n):
+        pos = start + (distance if i % 2 == 0 else 0)
+        d1.go_abs_pos_and_wait(pos=pos, speed=speed, acc=acc, timeout=10)
+        polls.append(d1.last_wait_polls)
+    duration = time.perf_counter() - t0
+    return dict(n=n, distance=distance, speed=speed, acc=acc,
+                moves_per_s=n/duration, move_s=duration/n,
+                expected_move_s=IgusDryveD1.estimate_move_time(distance, speed, acc),
+                polls_per_move=percentiles(polls))
+
+
+def bench_threads(d1, thread_counts=(1, 2, 4, 8), n_per_thread=500):
+    results = []
+    for k in thread_counts:
+        lat = [[] for i in range(k)]
+        def worker(out):
+            for i in range(n_per_thread):
+                t = time.perf_counter()
+                d1.read_status()
+                out.append(time.perf_counter() - t)
+        threads = [threading.Thread(target=worker, args=(lat[i],)) for i in range(k)]
+        t0 = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        duration = time.perf_counter() - t0
+        all_lat = [x for l in lat for x in l]
+        results.append(dict(threads=k, polls_per_s=len(all_lat)/duration,
+                            latency_s=percentiles(all_lat)))
+    return results
+
+
+def driver_version():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                       cwd=here, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(ip=None, port=502, n=2000, moves=20, move_distance=1000, threads=(1, 2, 4, 8),
+        sim_latency=0.0002, sim_jitter=0.0, allow_motion=False):
+    sim = None
+    if ip is None:
+        sim = DryveD1SimServer(latency=sim_latency, jitter=sim_jitter)
+        port = sim.start_in_thread()
+        ip = '127.0.0.1'
+        allow_motion = True
+    try:
+        t = time.perf_counter()
+        d1 = IgusDryveD1(ip, port, initialize=False)
+        connect_s = time.perf_counter() - t
+        results = dict(
+            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+            driver_version=driver_version(),
+            python=platform.python_version(),
+            target='simulator' if sim is not None else f"{ip}:{port}",
+            sim_latency=sim_latency if sim is not None else None,
+            connect_s=connect_s,
+            )
+        results['initialize'] = bench_initialize(d1)
+        results['latency'] = bench_latency(d1, n)
+        results['pipelined_poll'] = bench_pipelined(d1, n//4)
+        results['threads'] = bench_threads(d1, threads, n//4)
+        if moves and allow_motion:
+            results['moves'] = bench_moves(d1, moves, move_distance)
+        results['rx_stats'] = d1.get_rx_stats()
+        results['metrics'] = d1.metrics.snapshot()
+        d1.close()
+    finally:
+        if sim is not None:
+            sim.stop()
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="IgusDryveD1 driver benchmarks")
+    parser.add_argument('--ip', default=None, help="controller ip, default: local simulator")
+    parser.add_argument('--port', type=int, default=502)
+    parser.add_argument('-n', type=int, default=2000, help="requests for the latency benchmark")
+    parser.add_argument('--moves', type=int, default=20)
+    parser.add_argument('--move-distance', type=int, default=1000)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--sim-latency', type=float, default=0.0002)
+    parser.add_argument('--sim-jitter', type=float, default=0.0)
+    parser.add_argument('--allow-motion', action='store_true',
+                        help="run the move benchmark on a real controller")
+    parser.add_argument('--output', default=None, help="JSON results file")
+    args = parser.parse_args()
+
+    results = run(ip=args.ip, port=args.port, n=args.n, moves=args.moves,
+                  move_distance=args.move_distance,
+                  threads=[int(x) for x in args.threads.split(',')],
+                  sim_latency=args.sim_latency, sim_jitter=args.sim_jitter,
+                  allow_motion=args.allow_motion)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
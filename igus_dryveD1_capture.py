@@ -0,0 +1,197 @@
+"""
+Telegram capture and replay for the igus dryve D1.
+
+Record the traffic of a real axis:
+
+    d1.start_capture("axis1.dcap")
+    ... # the slow operation
+    d1.stop_capture()
+
+and play it back without hardware, with the original response times or as
+fast as possible:
+
+    d1 = open_replay("axis1.dcap", realtime=False)
+    d1.run_home_and_wait(speed=1000, acc=1000)
+
+The file is a short header followed by fixed size records (timestamp,
+direction, length, telegram bytes), so load_capture() can memory-map it
+as a numpy structured array.
+"""
+
+import collections
+import struct
+import threading
+import time
+
+MAGIC = b'DRYVCAP1'
+HEADER = struct.Struct('<8sH') # magic, record size
+MAX_TELEGRAM = 24
+RECORD = struct.Struct(f'<dBB{MAX_TELEGRAM}s') # time.time(), direction, length, telegram
+REQUEST, RESPONSE = 0, 1
+
+
+class TelegramCapture(object):
+
+    def __init__(self, fname):
+        self.fname = fname
+        self._f = open(fname, 'wb')
+        self._f.write(HEADER.pack(MAGIC, RECORD.size))
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def write(self, direction, telegram, t=None):
+        if t is None:
+            t = time.time()
+        n = min(len(telegram), MAX_TELEGRAM)
+        rec = RECORD.pack(t, direction, n, bytes(telegram[:n]))
+        with self._lock:
+            self._f.write(rec)
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+
+def load_capture(fname):
+    """
+    Memory-mapped capture file as a numpy structured array with fields
+    t, direction, length, data (uint8[24])
+    """
+    import numpy as np
+    with open(fname, 'rb') as f:
+        magic, record_size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or record_size != RECORD.size:
+        raise ValueError(f"{fname} is not a dryve D1 capture file")
+    dtype = np.dtype([('t', '<f8'), ('direction', 'u1'), ('length', 'u1'),
+                      ('data', 'u1', (MAX_TELEGRAM,))])
+    return np.memmap(fname, dtype=dtype, mode='r', offset=HEADER.size)
+
+
+def _transactions(records):
+    """
+    Pair requests with their responses by transaction id, in request order.
+    Returns list of (t_request, request bytes, latency, response bytes)
+    """
+    out = []
+    open_requests = {} # tid --> index in out
+    for rec in records:
+        n = int(rec['length'])
+        data = bytes(rec['data'][:n])
+        tid = (data[0] << 8) | data[1]
+        if rec['direction'] == REQUEST:
+            open_requests[tid] = len(out)
+            out.append([float(rec['t']), data, None, None])
+        else:
+            i = open_requests.pop(tid, None)
+            if i is not None:
+                out[i][2] = float(rec['t']) - out[i][0]
+                out[i][3] = data
+    return [tuple(x) for x in out if x[3] is not None]
+
+
+def capture_latencies(records):
+    """
+    Per transaction (t_request, sdo_obj, sub_index, latency) as numpy
+    arrays, eg to find the slow objects of a recording
+    """
+    import numpy as np
+    trans = _transactions(records)
+    return dict(
+        t=np.array([t for t, req, lat, resp in trans]),
+        sdo_obj=np.array([(req[12] << 8) | req[13] for t, req, lat, resp in trans]),
+        sub_index=np.array([req[14] for t, req, lat, resp in trans]),
+        latency=np.array([lat for t, req, lat, resp in trans]),
+        )
+
+
+class ReplayTransport(object):
+    """
+    Socket stand-in that answers IgusDryveD1 requests from a capture.
+
+    Each request is matched to the next recorded request with the same
+    content (ignoring the transaction id) and gets its recorded response.
+    A request that was polled more often than in the recording gets the
+    last recorded response to the same request; one never seen before
+    gets a Data Telegram Error (code 04h) and is counted in unmatched.
+    realtime=True delays each response by its recorded latency.
+    """
+
+    def __init__(self, fname, realtime=True):
+        self.realtime = realtime
+        self.transactions = _transactions(load_capture(fname))
+        self._cursor = 0
+        self._last = {} # request content --> last response
+        self._out = collections.deque() # (ready time, response bytes)
+        self._buf = b''
+        self._cond = threading.Condition()
+        self._closed = False
+        self.matched = 0
+        self.repeated = 0
+        self.unmatched = 0
+
+    def _lookup(self, key):
+        for i in range(self._cursor, len(self.transactions)):
+            t, req, latency, resp = self.transactions[i]
+            if req[2:] == key:
+                self._cursor = i + 1
+                self._last[key] = (latency, resp)
+                self.matched += 1
+                return latency, resp
+        if key in self._last:
+            self.repeated += 1
+            return self._last[key]
+        self.unmatched += 1
+        return 0.0, None
+
+    def sendall(self, data):
+        data = bytes(data)
+        now = time.monotonic()
+        with self._cond:
+            while data:
+                n = 6 + ((data[4] << 8) | data[5])
+                telegram, data = data[:n], data[n:]
+                latency, resp = self._lookup(telegram[2:])
+                if resp is None:
+                    # Data Telegram Error, Server Device Failure
+                    resp = bytes([0, 0, 0, 0, 0, 3, telegram[6], 0xAB, 0x04])
+                # answer with the transaction id of this request
+                resp = telegram[:2] + resp[2:]
+                ready = now + latency if self.realtime else now
+                self._out.append((ready, resp))
+            self._cond.notify_all()
+
+    def recv_into(self, view):
+        with self._cond:
+            while not self._buf:
+                if self._closed:
+                    return 0
+                if not self._out:
+                    self._cond.wait()
+                    continue
+                ready, resp = self._out[0]
+                dt = ready - time.monotonic()
+                if dt > 0:
+                    self._cond.wait(dt)
+                    continue
+                self._out.popleft()
+                self._buf = resp
+            n = min(len(view), len(self._buf))
+            view[:n] = self._buf[:n]
+            self._buf = self._buf[n:]
+            return n
+
+    def shutdown(self, how=None):
+        self.close()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def open_replay(fname, realtime=False, initialize=False, **kwargs):
+    "IgusDryveD1 connected to a ReplayTransport of capture fname"
+    from ScopeFoundryHW.igus_dryve.igus_dryveD1 import IgusDryveD1
+    transport = ReplayTransport(fname, realtime=realtime)
+    return IgusDryveD1('replay:' + fname, initialize=initialize, transport=transport, **kwargs)
@@ -0,0 +1,177 @@
+"""
+Cyclic Synchronous Position (mode 8) setpoint streaming for the igus dryve D1.
+
+    streamer = CyclicPositionStreamer(d1, trajectory, cycle_time=0.005)
+    streamer.start()
+    streamer.join()
+    print(streamer.get_stats())
+
+trajectory is any iterable of absolute positions (numpy array, list or
+generator), one setpoint per cycle. A dedicated thread sends them on a
+fixed time base and keeps jitter and missed-cycle statistics.
+"""
+
+import threading
+import time
+
+from ScopeFoundryHW.igus_dryve.igus_dryveD1 import sdo_codec
+
+
+class CyclicPositionStreamer(object):
+
+    def __init__(self, d1, trajectory, cycle_time=0.005, spin_time=0.001,
+                 set_interpolation_period=True, mode_timeout=1.0):
+        """
+        d1: connected (operation enabled) IgusDryveD1
+        trajectory: iterable of target positions, one per cycle
+        cycle_time: setpoint period (s)
+        spin_time: the last part of each wait (s) is a busy wait on
+            time.perf_counter() rather than time.sleep(), for precise timing
+        set_interpolation_period: write the cycle time to the
+            Interpolation Time Period object 60C2h before starting
+        """
+        self.d1 = d1
+        self.trajectory = trajectory
+        self.cycle_time = cycle_time
+        self.spin_time = spin_time
+        self.set_interpolation_period = set_interpolation_period
+        self.mode_timeout = mode_timeout
+
+        self.thread = None
+        self.interrupt_flag = threading.Event()
+        self.error = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.cycles = 0
+        self.missed_cycles = 0
+        self._late_sum = 0.0
+        self._late_sumsq = 0.0
+        self._late_max = 0.0
+        self.t_start = None
+        self.t_stop = None
+
+    @staticmethod
+    def interpolation_period(cycle_time):
+        """
+        60C2h Interpolation Time Period (value, index) for cycle_time (s):
+        value (uint8, sub 1) * 10^index (sub 2) s. Whole milliseconds use
+        index -3, other periods the first index of -4..-6, -2..0 that
+        represents them (to within 0.1%) with value 1..255. Raises
+        ValueError for a period that has no such representation
+        """
+        for index in (-3, -4, -5, -6, -2, -1, 0):
+            value = int(round(cycle_time * 10**-index))
+            if 1 <= value <= 255 and abs(value * 10.0**index - cycle_time) <= 1e-3*cycle_time:
+                return value, index
+        raise ValueError(f"unsupported interpolation period {cycle_time} s, "
+                         "must be value * 10^index s with value 1..255, index -6..0")
+
+    def setup(self):
+        d1 = self.d1
+        if self.set_interpolation_period:
+            value, index = self.interpolation_period(self.cycle_time)
+            # 60C2h Interpolation Time Period: value (sub 1) * 10^index (sub 2) s
+            d1.ask_many([
+                dict(write=True, sdo_obj=0x60C2, sub_index=1, datatype='B', data=value),
+                dict(write=True, sdo_obj=0x60C2, sub_index=2, datatype='b', data=index),
+                ])
+        # 8 Cyclic Synchronous Position mode
+        d1.write_mode_and_wait(8, timeout=self.mode_timeout)
+
+    def start(self):
+        self.setup()
+        self.interrupt_flag.clear()
+        self.error = None
+        self._reset_stats()
+        self.thread = threading.Thread(target=self._run, name='CyclicPositionStreamer',
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.interrupt_flag.set()
+        self.join()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _wait_until(self, t):
+        while True:
+            dt = t - time.perf_counter()
+            if dt <= 0:
+                return
+            if dt > self.spin_time:
+                time.sleep(dt - self.spin_time)
+
+    def _run(self):
+        d1 = self.d1
+        cycle = self.cycle_time
+        # 607Ah Target Position
+        codec = sdo_codec(True, 0x607A, 0, 'i')
+        setpoints = iter(self.trajectory)
+        prev_tid = None
+        try:
+            self.t_start = time.perf_counter()
+            t_next = self.t_start
+            for pos in setpoints:
+                if self.interrupt_flag.is_set():
+                    break
+                self._wait_until(t_next)
+                late = time.perf_counter() - t_next
+                if late >= cycle:
+                    # fell behind: drop the setpoints whose time has passed
+                    # to stay on the time base
+                    missed = int(late // cycle)
+                    self.missed_cycles += missed
+                    t_next += missed*cycle
+                    late -= missed*cycle
+                    for _ in range(missed):
+                        try:
+                            pos = next(setpoints)
+                        except StopIteration:
+                            break
+                # send without waiting, the response is collected next cycle
+                tid, = d1.send_sdo_requests([(codec, int(pos))])
+                if prev_tid is not None:
+                    d1.recv_telegram(prev_tid)
+                prev_tid = tid
+
+                self.cycles += 1
+                self._late_sum += late
+                self._late_sumsq += late*late
+                if late > self._late_max:
+                    self._late_max = late
+                t_next += cycle
+            if prev_tid is not None:
+                d1.recv_telegram(prev_tid)
+        except Exception as err:
+            self.error = err
+        finally:
+            self.t_stop = time.perf_counter()
+
+    def get_stats(self):
+        """
+        jitter_*: lateness of the setpoint transmissions against the cycle
+        time base (s). missed_cycles: setpoints dropped because the
+        streamer fell more than a full cycle behind.
+        """
+        n = max(self.cycles, 1)
+        mean = self._late_sum / n
+        var = max(self._late_sumsq / n - mean*mean, 0.0)
+        duration = 0.0
+        if self.t_start is not None:
+            duration = (self.t_stop or time.perf_counter()) - self.t_start
+        return dict(cycles=self.cycles,
+                    missed_cycles=self.missed_cycles,
+                    cycle_time=self.cycle_time,
+                    duration=duration,
+                    jitter_mean=mean,
+                    jitter_std=var**0.5,
+                    jitter_max=self._late_max)
@@ -0,0 +1,185 @@
+"""
+Drive several igus dryve D1 controllers concurrently.
+
+    group = DryveGroup(["192.168.0.10", "192.168.0.15"])
+    group.connect()
+    group.home(speed=[1000, 2000], acc=1000, speed2=[500, 2000], timeout=20)
+    group.move_abs([80000, 5000], speed=[5000, 2000], acc=1000, timeout=10)
+
+Each axis runs on its own worker thread, so connecting, homing and moving
+takes as long as the slowest axis rather than the sum of all of them.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ScopeFoundryHW.igus_dryve.igus_dryveD1 import IgusDryveD1
+
+
+class DryveGroup(object):
+
+    def __init__(self, axes, port=502, debug=False, poll_interval=0.005):
+        """
+        axes: list of ip addresses and/or already connected IgusDryveD1 objects
+        """
+        self.port = port
+        self.debug = debug
+        # sleep between status polls while waiting for the axes
+        self.poll_interval = poll_interval
+        self.ip_addresses = []
+        self.axes = []
+        for ax in axes:
+            if isinstance(ax, IgusDryveD1):
+                self.ip_addresses.append(ax.ip_address)
+                self.axes.append(ax)
+            else:
+                self.ip_addresses.append(ax)
+                self.axes.append(None)
+        self.executor = ThreadPoolExecutor(max_workers=len(self.axes),
+                                           thread_name_prefix='DryveGroup')
+
+    def __len__(self):
+        return len(self.axes)
+
+    def _per_axis(self, value):
+        # scalar --> same value for every axis
+        if isinstance(value, (list, tuple)):
+            assert len(value) == len(self.axes)
+            return list(value)
+        return [value]*len(self.axes)
+
+    def _run_all(self, func, *per_axis_args):
+        """
+        call func(i, *args) for every axis in parallel and wait for all of them.
+        If any axis fails the first error is re-raised (after all have finished)
+        """
+        if per_axis_args:
+            args_list = list(zip(*per_axis_args))
+        else:
+            args_list = [()]*len(self.axes)
+        futures = [self.executor.submit(func, i, *args)
+                   for i, args in enumerate(args_list)]
+        results = []
+        first_err = None
+        for i, fut in enumerate(futures):
+            try:
+                results.append(fut.result())
+            except Exception as err:
+                results.append(None)
+                if first_err is None:
+                    first_err = IOError(f"axis {i} ({self.ip_addresses[i]}): {err}")
+                    first_err.__cause__ = err
+        if first_err is not None:
+            raise first_err
+        return results
+
+    @staticmethod
+    def _remaining(deadline):
+        return max(0.0, deadline - time.monotonic())
+
+    def connect(self, initialize=True):
+        def _connect(i):
+            if self.axes[i] is None:
+                self.axes[i] = IgusDryveD1(self.ip_addresses[i], self.port,
+                                           initialize=initialize, debug=self.debug)
+            elif initialize:
+                self.axes[i].initialize()
+        self._run_all(_connect)
+
+    def initialize(self):
+        self._run_all(lambda i: self.axes[i].initialize())
+
+    def close(self):
+        for d1 in self.axes:
+            if d1 is not None:
+                d1.close()
+        self.axes = [None]*len(self.axes)
+        self.executor.shutdown(wait=False)
+
+    def home(self, speed, acc, speed2=None, timeout=20.0):
+        """
+        run_home_and_wait on all axes at once, timeout is a shared deadline.
+        Raises IOError if any axis reports a homing error, returns the list
+        of final statuses
+        """
+        deadline = time.monotonic() + timeout
+        def _home(i, speed, acc, speed2):
+            status = self.axes[i].run_home_and_wait(speed=speed, acc=acc, speed2=speed2,
+                                                    timeout=self._remaining(deadline))
+            if status['oms'] == 0b10:
+                raise IOError("homing error")
+            return status
+        return self._run_all(_home, self._per_axis(speed), self._per_axis(acc),
+                             self._per_axis(speed2))
+
+    def move_abs(self, positions, speed, acc, timeout=10.0, wait=True):
+        """
+        Absolute profile position move of every axis. All axes are configured
+        first, then started together (released by a barrier), and with
+        wait=True the call returns once all axes report target reached.
+        """
+        deadline = time.monotonic() + timeout
+        self._run_all(lambda i, pos, speed, acc: self.axes[i].setup_abs_move(pos, speed, acc),
+                      self._per_axis(positions), self._per_axis(speed), self._per_axis(acc))
+        self.trigger_all()
+        if wait:
+            return self.wait_all_reached(timeout=self._remaining(deadline))
+
+    def trigger_all(self):
+        """start the moves of all axes at the same moment"""
+        barrier = threading.Barrier(len(self.axes))
+        def _trigger(i):
+            barrier.wait()
+            self.axes[i].trigger_move()
+        self._run_all(_trigger)
+
+    def halt_all(self):
+        self._run_all(lambda i: self.axes[i].halt_motion())
+
+    def wait_all_reached(self, timeout=10.0, halt_on_fault=True):
+        """
+        Wait until every axis reports target reached ("all reached") or stop
+        as soon as any axis reports a fault ("any faulted"), in which case
+        the other axes are halted and an IOError is raised.
+        Returns the list of final statuses.
+        """
+        deadline = time.monotonic() + timeout
+        abort = threading.Event()
+        def _wait(i):
+            d1 = self.axes[i]
+            while not abort.is_set():
+                status = d1.read_status()
+                if status['f']:
+                    abort.set()
+                    raise IOError("fault during move")
+                if status['tr']:
+                    return status
+                if time.monotonic() > deadline:
+                    raise IOError("timeout occurred in wait_all_reached")
+                time.sleep(self.poll_interval)
+            return None
+        try:
+            return self._run_all(_wait)
+        except IOError:
+            if halt_on_fault and abort.is_set():
+                self.halt_all()
+            raise
+
+    def read_positions(self):
+        return self._run_all(lambda i: self.axes[i].read_actual_position())
+
+    def read_statuses(self):
+        return self._run_all(lambda i: self.axes[i].read_status())
+
+
+if __name__ == '__main__':
+    group = DryveGroup(["192.168.0.10", "192.168.0.15"], debug=True)
+    group.connect(initialize=True)
+    for d1, fc in zip(group.axes, [12500, 2500]):
+        d1.write_feed_constant(fc)
+        d1.write_feed_revs(1)
+    group.home(speed=[1000, 2000], acc=1000, speed2=[500, 2000], timeout=20)
+    group.move_abs([80000, 5000], speed=[5000, 2000], acc=1000, timeout=10)
+    print(group.read_positions())
+    group.close()
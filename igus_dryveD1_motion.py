@@ -0,0 +1,128 @@
+"""
+Non-blocking motion for the igus dryve D1.
+
+    worker = AxisWorker(d1)
+    fut = worker.move_to(10000, speed=5000, acc=20000)
+    ... # acquire data while the stage moves
+    fut.result(timeout=15)
+
+Moves and homing run one after another on a worker thread per axis and
+are returned as concurrent.futures.Future objects (MotionFuture), so
+add_done_callback(), concurrent.futures.wait() etc. work as usual.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future, CancelledError
+
+from ScopeFoundryHW.igus_dryve.igus_dryveD1 import DryveD1Interrupted
+
+
+class MotionFuture(Future):
+
+    def __init__(self, d1):
+        super().__init__()
+        self.d1 = d1
+        # set when the running motion should stop waiting
+        self.interrupt = threading.Event()
+
+    def cancel(self):
+        """
+        A motion that has not started yet is cancelled as usual. A running
+        one is stopped with halt_motion(), its result() then raises
+        CancelledError (cancelled() stays False, as for any running Future).
+        """
+        if super().cancel():
+            return True
+        if self.done():
+            return False
+        self.interrupt.set()
+        self.d1.halt_motion()
+        return True
+
+
+class AxisWorker(object):
+
+    def __init__(self, d1, name='igus_d1'):
+        """d1: connected IgusDryveD1"""
+        self.d1 = d1
+        self._queue = queue.Queue()
+        self._futures = set()
+        self._futures_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name=f"AxisWorker {name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, interrupt=event, **kwargs) on the worker thread, returns
+        a MotionFuture. fn should stop waiting when the event is set
+        (see IgusDryveD1.wait_for)
+        """
+        fut = MotionFuture(self.d1)
+        with self._futures_lock:
+            self._futures.add(fut)
+        fut.add_done_callback(self._discard)
+        self._queue.put((fut, fn, args, kwargs))
+        return fut
+
+    def _discard(self, fut):
+        with self._futures_lock:
+            self._futures.discard(fut)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            fut, fn, args, kwargs = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, interrupt=fut.interrupt, **kwargs)
+            except DryveD1Interrupted:
+                # the cancel may have halted before the move was triggered,
+                # halt again so the axis surely stops
+                try:
+                    self.d1.halt_motion()
+                except BaseException as err:
+                    fut.set_exception(err)
+                else:
+                    fut.set_exception(CancelledError())
+            except BaseException as err:
+                fut.set_exception(err)
+            else:
+                if fut.interrupt.is_set():
+                    # halted, a halted drive also reports target reached
+                    fut.set_exception(CancelledError())
+                else:
+                    fut.set_result(result)
+
+    def move_to(self, pos, speed, acc, timeout=10.0):
+        "absolute move in profile position mode, result is the final status"
+        return self.submit(self.d1.go_abs_pos_and_wait, pos, speed, acc, timeout=timeout)
+
+    def home(self, speed, acc, speed2=None, timeout=20.0):
+        "homing, result is the final status. A homing error fails the future with IOError"
+        return self.submit(self._home, speed, acc, speed2, timeout)
+
+    def _home(self, speed, acc, speed2, timeout, interrupt=None):
+        status = self.d1.run_home_and_wait(speed, acc, speed2=speed2, timeout=timeout,
+                                           interrupt=interrupt)
+        if status['oms'] == 0b10:
+            raise IOError("homing error")
+        return status
+
+    def cancel_all(self):
+        "cancel pending motions and halt the running one"
+        with self._futures_lock:
+            futures = list(self._futures)
+        # pending ones first, so the worker does not start one after the halt
+        for fut in sorted(futures, key=lambda f: f.running()):
+            fut.cancel()
+
+    def shutdown(self, cancel=True, wait=True):
+        if cancel:
+            self.cancel_all()
+        self._queue.put(None)
+        if wait:
+            self.thread.join()
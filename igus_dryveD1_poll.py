@@ -0,0 +1,115 @@
+"""
+Adaptive polling of the igus dryve D1 for GUI updates.
+
+Every polled object has its own interval while the axis is moving and
+while it is idle, and all objects that are due are read in a single
+pipelined request (IgusDryveD1.ask_many). An idle axis is only asked for
+its statusword now and then; after a move is triggered or the mode of
+operation is written, the affected objects are polled right away.
+"""
+
+import time
+
+
+class PollEntry(object):
+
+    __slots__ = ('name', 'request', 'interval_moving', 'interval_idle', 'next_due')
+
+    def __init__(self, name, request, interval_moving, interval_idle):
+        self.name = name
+        self.request = request
+        # None: only polled when requested, see PollScheduler.request_poll
+        self.interval_moving = interval_moving
+        self.interval_idle = interval_idle
+        self.next_due = 0.0
+
+
+class PollScheduler(object):
+
+    def __init__(self, d1, max_sleep=0.1):
+        """
+        d1: connected IgusDryveD1
+        max_sleep: longest time_to_next(), so the caller stays responsive
+        """
+        self.d1 = d1
+        self.max_sleep = max_sleep
+        self.entries = {}
+        self.moving = False
+        self.values = {}
+        self.polls = 0
+
+        self.add('status', dict(sdo_obj=0x6041, sub_index=0, datatype='H'),
+                 interval_moving=0.05, interval_idle=0.25)
+        self.add('position', dict(sdo_obj=0x6064, sub_index=0, datatype='i'),
+                 interval_moving=0.02, interval_idle=2.0)
+        # mode only changes when written, poll it after each mode write
+        self.add('mode', dict(sdo_obj=0x6061, sub_index=0, datatype='B'),
+                 interval_moving=None, interval_idle=None)
+
+        self._mode_writes = d1.mode_writes
+        self._move_triggers = d1.move_triggers
+
+    def add(self, name, request, interval_moving, interval_idle):
+        """request: ask() keyword arguments, see IgusDryveD1.ask_many"""
+        self.entries[name] = PollEntry(name, request, interval_moving, interval_idle)
+
+    def set_intervals(self, name, interval_moving, interval_idle):
+        entry = self.entries[name]
+        entry.interval_moving = interval_moving
+        entry.interval_idle = interval_idle
+        entry.next_due = 0.0
+
+    def request_poll(self, name):
+        "poll name at the next poll()"
+        self.entries[name].next_due = 0.0
+
+    def _check_events(self):
+        d1 = self.d1
+        if d1.mode_writes != self._mode_writes:
+            self._mode_writes = d1.mode_writes
+            self.request_poll('mode')
+        if d1.move_triggers != self._move_triggers:
+            self._move_triggers = d1.move_triggers
+            self.moving = True
+            self.request_poll('status')
+            self.request_poll('position')
+
+    def poll(self):
+        """
+        Read every due object in one request, returns dict name --> value
+        of what was read (empty if nothing was due). Objects that came back
+        without a value are left out and retried after max_sleep.
+        """
+        self._check_events()
+        now = time.monotonic()
+        due = [e for e in self.entries.values() if e.next_due <= now]
+        if not due:
+            return {}
+        results = self.d1.ask_many([e.request for e in due])
+        self.polls += 1
+        values = {e.name: x for e, x in zip(due, results) if x is not None}
+        self.values.update(values)
+
+        if 'status' in values:
+            status = self.d1.decode_status(values['status'])
+            was_moving = self.moving
+            # enabled and target not reached yet: moving
+            self.moving = bool(status.oe and not status.tr)
+            if self.moving != was_moving:
+                # reschedule everything for the new state
+                for e in self.entries.values():
+                    if e.name not in values and e.interval_idle is not None:
+                        e.next_due = now
+        for e in due:
+            if e.name not in values:
+                # retry soon, also objects only polled on request
+                e.next_due = now + self.max_sleep
+                continue
+            interval = e.interval_moving if self.moving else e.interval_idle
+            e.next_due = now + interval if interval is not None else float('inf')
+        return values
+
+    def time_to_next(self):
+        now = time.monotonic()
+        t = min([e.next_due for e in self.entries.values()], default=now + self.max_sleep)
+        return min(max(t - now, 0.0), self.max_sleep)
@@ -0,0 +1,433 @@
+"""
+Simulated igus dryve D1 for testing and benchmarking without hardware.
+
+Speaks the Modbus TCP gateway (0x2B / MEI 0x0D) CANopen SDO telegrams that
+IgusDryveD1.ask builds and models the CiA 402 state machine, the
+statusword, profile position moves, homing and cyclic synchronous
+position mode, with configurable latency/jitter and fault injection.
+
+From a script or test:
+
+    sim = DryveD1SimServer(latency=0.0005)
+    port = sim.start_in_thread()
+    d1 = IgusDryveD1("127.0.0.1", port)
+    ...
+    sim.axis.inject_fault()
+    sim.stop()
+
+From the command line:
+
+    python igus_dryveD1_sim.py --port 5020 --latency 0.001 --jitter 0.0005
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+
+# CiA 402 power states
+SWITCH_ON_DISABLED = 'switch_on_disabled'
+READY_TO_SWITCH_ON = 'ready_to_switch_on'
+SWITCHED_ON = 'switched_on'
+OPERATION_ENABLED = 'operation_enabled'
+QUICK_STOP_ACTIVE = 'quick_stop_active'
+FAULT = 'fault'
+
+# statusword bits 0-6 for each state
+STATE_STATUS_BITS = {
+    SWITCH_ON_DISABLED: 0b100_0000,
+    READY_TO_SWITCH_ON: 0b010_0001,
+    SWITCHED_ON:        0b010_0011,
+    OPERATION_ENABLED:  0b010_0111,
+    QUICK_STOP_ACTIVE:  0b000_0111,
+    FAULT:              0b000_1000,
+    }
+
+# object dictionary: (index, sub_index) --> (struct datatype, writable, default)
+OBJECTS = {
+    (0x6040, 0): ('H', True, 0),        # Controlword
+    (0x6041, 0): ('H', False, 0),       # Statusword
+    (0x6060, 0): ('b', True, 0),        # Modes of operation
+    (0x6061, 0): ('b', False, 0),       # Modes of operation display
+    (0x6064, 0): ('i', False, 0),       # Position actual value
+    (0x606C, 0): ('i', False, 0),       # Velocity actual value
+    (0x607A, 0): ('i', True, 0),        # Target position
+    (0x607D, 1): ('i', True, -2**31),   # Software position limit min
+    (0x607D, 2): ('i', True, 2**31-1),  # Software position limit max
+    (0x6081, 0): ('I', True, 1000),     # Profile velocity
+    (0x6083, 0): ('I', True, 1000),     # Profile acceleration
+    (0x6092, 1): ('I', True, 6000),     # Feed constant Feed
+    (0x6092, 2): ('I', True, 1),        # Feed constant Shaft revolutions
+    (0x6098, 0): ('b', True, 17),       # Homing method
+    (0x6099, 1): ('I', True, 1000),     # Homing speed search for switch
+    (0x6099, 2): ('I', True, 1000),     # Homing speed search for zero
+    (0x609A, 0): ('I', True, 1000),     # Homing acceleration
+    (0x60C2, 1): ('B', True, 1),        # Interpolation time period value
+    (0x60C2, 2): ('b', True, -3),       # Interpolation time index
+    }
+
+
+class TrapezoidMove(object):
+    """time-parameterized trapezoidal (or triangular) profile move"""
+
+    __slots__ = ('t0', 'p0', 'p1', 'acc', 'duration', 't_acc', 'v_peak', 'direction', 'distance')
+
+    def __init__(self, t0, p0, p1, speed, acc):
+        self.t0 = t0
+        self.p0 = p0
+        self.p1 = p1
+        self.distance = abs(p1 - p0)
+        self.direction = 1 if p1 >= p0 else -1
+        self.acc = acc
+        if speed <= 0 or acc <= 0 or self.distance == 0:
+            self.duration = self.t_acc = self.v_peak = 0.0
+        elif self.distance >= speed*speed/acc:
+            self.v_peak = speed
+            self.t_acc = speed/acc
+            self.duration = self.distance/speed + speed/acc
+        else:
+            self.t_acc = (self.distance/acc)**0.5
+            self.v_peak = acc*self.t_acc
+            self.duration = 2*self.t_acc
+
+    def done(self, t):
+        return t - self.t0 >= self.duration
+
+    def position(self, t):
+        dt = t - self.t0
+        if dt >= self.duration:
+            return self.p1
+        a, ta, T = self.acc, self.t_acc, self.duration
+        if dt < ta:
+            s = 0.5*a*dt*dt
+        elif dt < T - ta:
+            s = 0.5*a*ta*ta + self.v_peak*(dt - ta)
+        else:
+            s = self.distance - 0.5*a*(T - dt)**2
+        return self.p0 + self.direction*int(round(s))
+
+    def velocity(self, t):
+        dt = t - self.t0
+        if dt >= self.duration or dt < 0:
+            return 0
+        ta, T = self.t_acc, self.duration
+        if dt < ta:
+            v = self.acc*dt
+        elif dt < T - ta:
+            v = self.v_peak
+        else:
+            v = self.acc*(T - dt)
+        return self.direction*int(round(v))
+
+
+class SimulatedDryveD1(object):
+    """
+    Model of one dryve D1 axis. handle_telegram() takes a request telegram
+    and returns the response telegram (or None to drop it).
+    """
+
+    def __init__(self, remote_enable=True, mode_change_delay=0.002, home_position=0):
+        self.od = {key: default for key, (dt, w, default) in OBJECTS.items()}
+        self.state = SWITCH_ON_DISABLED
+        # DI7 enable switch, statusword bit 9
+        self.remote_enable = remote_enable
+        self.mode_change_delay = mode_change_delay
+        self.home_position = home_position
+
+        self.position = 0
+        self.move = None
+        self.halted = False
+        self.setpoint_ack = False
+        self.homing = None # None, 'running', 'attained', 'error'
+        self._mode_pending = None # (mode, time effective)
+        self._prev_controlword = 0
+
+        # fault injection
+        self.homing_error = False # next homing run ends with homing error
+        self._fail_next = 0
+        self._fail_code = 0x04
+        self.drop_next = 0 # number of requests to leave unanswered
+
+        self.requests = 0
+
+    # ---- fault injection
+
+    def inject_fault(self):
+        "drive goes to the FAULT state, motion stops"
+        self._update(time.monotonic())
+        self.move = None
+        self.state = FAULT
+
+    def fail_next(self, n=1, code=0x04):
+        "answer the next n requests with a Data Telegram Error (exception code)"
+        self._fail_next = n
+        self._fail_code = code
+
+    # ---- model
+
+    def _update(self, t):
+        if self._mode_pending is not None and t >= self._mode_pending[1]:
+            self.od[(0x6061, 0)] = self._mode_pending[0]
+            self._mode_pending = None
+        if self.move is not None:
+            self.position = self.move.position(t)
+            if self.move.done(t):
+                self.move = None
+                if self.homing == 'running':
+                    if self.homing_error:
+                        self.homing_error = False
+                        self.homing = 'error'
+                    else:
+                        self.homing = 'attained'
+                        self.position = self.home_position
+        self.od[(0x6064, 0)] = self.position
+        self.od[(0x606C, 0)] = self.move.velocity(t) if self.move is not None else 0
+
+    def statusword(self, t=None):
+        if t is None:
+            t = time.monotonic()
+        self._update(t)
+        x = STATE_STATUS_BITS[self.state]
+        if self.state not in (SWITCH_ON_DISABLED, FAULT):
+            x |= 1 << 4 # Voltage Enabled
+        if self.remote_enable:
+            x |= 1 << 9
+        if self.move is None:
+            x |= 1 << 10 # Target Reached
+        mode = self.od[(0x6061, 0)]
+        if mode == 1 and self.setpoint_ack:
+            x |= 1 << 12
+        elif mode == 6:
+            if self.homing == 'attained':
+                x |= 1 << 12
+            elif self.homing == 'error':
+                x |= 1 << 13
+        return x
+
+    def _write_controlword(self, cw, t):
+        self._update(t)
+        prev = self._prev_controlword
+        self._prev_controlword = cw
+        so, ev, qs, eo = cw & 1, (cw >> 1) & 1, (cw >> 2) & 1, (cw >> 3) & 1
+        fault_reset = (cw >> 7) & 1 and not (prev >> 7) & 1
+        self.halted = bool((cw >> 8) & 1)
+
+        state = self.state
+        if state == FAULT:
+            if fault_reset:
+                self.state = SWITCH_ON_DISABLED
+            return
+        if not ev:
+            self.state = SWITCH_ON_DISABLED # disable voltage
+        elif not qs:
+            self.state = QUICK_STOP_ACTIVE if state == OPERATION_ENABLED else SWITCH_ON_DISABLED
+        elif not so:
+            if state != QUICK_STOP_ACTIVE:
+                self.state = READY_TO_SWITCH_ON # shutdown
+        elif not eo:
+            if state in (READY_TO_SWITCH_ON, OPERATION_ENABLED):
+                self.state = SWITCHED_ON
+        else:
+            if state in (READY_TO_SWITCH_ON, SWITCHED_ON):
+                self.state = OPERATION_ENABLED
+
+        if self.state != OPERATION_ENABLED or self.halted:
+            if self.move is not None:
+                self.move = None # stop
+                if self.homing == 'running':
+                    self.homing = None
+            return
+
+        mode = self.od[(0x6061, 0)]
+        new_setpoint = (cw >> 4) & 1 and not (prev >> 4) & 1
+        if not (cw >> 4) & 1:
+            self.setpoint_ack = False
+        if not new_setpoint:
+            return
+        if mode == 1: # profile position
+            self.setpoint_ack = True
+            self.move = TrapezoidMove(t, self.position, self.od[(0x607A, 0)],
+                                      self.od[(0x6081, 0)], self.od[(0x6083, 0)])
+            if self.move.duration == 0:
+                self.move = None
+        elif mode == 6: # homing, drive to the reference point
+            self.homing = 'running'
+            self.move = TrapezoidMove(t, self.position, self.home_position,
+                                      self.od[(0x6099, 1)], self.od[(0x609A, 0)])
+            if self.move.duration == 0:
+                # already there, still takes a moment
+                self.move = TrapezoidMove(t, self.position, self.position, 0, 0)
+                self.move.duration = 0.01
+
+    def _write(self, key, value, t):
+        if key == (0x6040, 0):
+            self._write_controlword(value, t)
+        elif key == (0x6060, 0):
+            self._mode_pending = (value, t + self.mode_change_delay)
+            if self.mode_change_delay <= 0:
+                self._update(t)
+        elif key == (0x607A, 0) and self.od[(0x6061, 0)] == 8 and self.state == OPERATION_ENABLED:
+            # cyclic synchronous position: follow the setpoint
+            self._update(t)
+            self.move = None
+            self.position = value
+        self.od[key] = value
+
+    def handle_telegram(self, telegram):
+        self.requests += 1
+        if self.drop_next > 0:
+            self.drop_next -= 1
+            return None
+        header = bytes(telegram[:19])
+        if len(telegram) < 19 or telegram[7] != 0x2B or telegram[8] != 0x0D:
+            return self._error(telegram, 0x01) # illegal function
+        if self._fail_next > 0:
+            self._fail_next -= 1
+            return self._error(telegram, self._fail_code)
+        write = telegram[9] == 1
+        key = ((telegram[12] << 8) | telegram[13], telegram[14])
+        byte_count = telegram[18]
+        if key not in OBJECTS or byte_count not in (1, 2, 4):
+            return self._error(telegram, 0x02) # illegal data address
+        datatype, writable, _ = OBJECTS[key]
+        signed = datatype.islower()
+        t = time.monotonic()
+        if write:
+            if not writable or len(telegram) < 19 + byte_count:
+                return self._error(telegram, 0x03) # illegal data value
+            value = int.from_bytes(telegram[19:19+byte_count], 'little', signed=signed)
+            self._write(key, value, t)
+            # write confirmation echoes the request
+            return bytes(telegram[:19+byte_count])
+        if key == (0x6041, 0):
+            value = self.statusword(t)
+        else:
+            self._update(t)
+            value = self.od[key]
+        data = (value & ((1 << (8*byte_count)) - 1)).to_bytes(byte_count, 'little')
+        resp = bytearray(header)
+        resp[5] = 13 + byte_count
+        return bytes(resp) + data
+
+    @staticmethod
+    def _error(telegram, code):
+        # exception response: function code | 0x80, exception code
+        return bytes(telegram[0:4]) + bytes([0, 3, telegram[6], 0xAB, code])
+
+
+class DryveD1SimServer(object):
+    """
+    asyncio Modbus TCP server around a SimulatedDryveD1. All connections
+    share the same axis. latency + uniform random jitter (s) is added
+    before each response, requests on one connection are answered in order.
+    split_responses sends each response one byte at a time, to exercise
+    the client's framing.
+    """
+
+    def __init__(self, axis=None, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 split_responses=False):
+        self.axis = axis if axis is not None else SimulatedDryveD1()
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.split_responses = split_responses
+        self.server = None
+        self.loop = None
+        self.thread = None
+        self._writers = set()
+        self._tasks = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        self._tasks.add(asyncio.current_task())
+        try:
+            while True:
+                header = await reader.readexactly(6)
+                length = (header[4] << 8) | header[5]
+                telegram = header + await reader.readexactly(length)
+                delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                resp = self.axis.handle_telegram(telegram)
+                if resp is None:
+                    continue
+                if self.split_responses:
+                    for i in range(len(resp)):
+                        writer.write(resp[i:i+1])
+                        await writer.drain()
+                else:
+                    writer.write(resp)
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._tasks.discard(asyncio.current_task())
+            writer.close()
+
+    def drop_connections(self):
+        "close all client connections (simulates a network drop)"
+        for writer in list(self._writers):
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(writer.close)
+            else:
+                writer.close()
+
+    def start_in_thread(self):
+        """run the server on its own event loop thread, returns the port"""
+        started = threading.Event()
+        def _run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+        self.thread = threading.Thread(target=_run, name='DryveD1SimServer', daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.port
+
+    def stop(self):
+        if self.loop is None:
+            if self.server is not None:
+                self.server.close()
+            return
+        async def _shutdown():
+            self.server.close()
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(_shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="simulated igus dryve D1 (Modbus TCP)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5020)
+    parser.add_argument('--latency', type=float, default=0.0, help="response delay (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra delay (s)")
+    parser.add_argument('--split', action='store_true', help="send responses byte by byte")
+    args = parser.parse_args()
+
+    async def main():
+        sim = DryveD1SimServer(host=args.host, port=args.port, latency=args.latency,
+                               jitter=args.jitter, split_responses=args.split)
+        port = await sim.start()
+        print(f"simulated dryve D1 listening on {args.host}:{port}")
+        async with sim.server:
+            await sim.server.serve_forever()
+
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+"""
+Shared axis state for the igus dryve D1.
+
+One StatePublisher per controller polls status, mode and position (with
+the adaptive rates of PollScheduler) and publishes each result as an
+immutable, versioned AxisSnapshot. Any number of readers get the latest
+snapshot without a lock and without I/O, so the load on the controller
+does not depend on the number of consumers:
+
+    pub = d1.state_publisher()
+    snap = pub.latest()
+    snap = pub.wait_newer(snap.version, timeout=1.0)
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from ScopeFoundryHW.igus_dryve.igus_dryveD1_poll import PollScheduler
+
+
+# t: time.time() of the poll. Values not polled in that cycle are carried
+# over from the previous snapshot (None until first read)
+AxisSnapshot = namedtuple('AxisSnapshot', 'version t position status mode')
+
+
+class StatePublisher(object):
+
+    def __init__(self, d1, max_sleep=0.1, error_retry=0.5):
+        """
+        d1: connected IgusDryveD1
+        max_sleep: longest pause between polls, see PollScheduler
+        error_retry: pause after a failed poll (s)
+        """
+        self.d1 = d1
+        self.poller = PollScheduler(d1, max_sleep=max_sleep)
+        self.error_retry = error_retry
+        # replaced (never modified) by the poller thread, reading it needs no lock
+        self.snapshot = AxisSnapshot(0, None, None, None, None)
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self.thread = None
+        self.interrupt_flag = threading.Event()
+        # exception of the last poll, None once a poll succeeds again
+        self.error = None
+        self.errors = 0
+        # > 0: another poller feeds publish() (eg a TelemetryRecorder), no
+        # polling of our own, see pause
+        self._paused = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.interrupt_flag.clear()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='StatePublisher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.interrupt_flag.set()
+        self._wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def latest(self):
+        "most recent AxisSnapshot (version 0: nothing polled yet)"
+        return self.snapshot
+
+    def wait_newer(self, version, timeout=None):
+        """
+        Wait for a snapshot with a version above version, returns it or
+        None after timeout
+        """
+        snap = self.snapshot
+        if snap.version > version:
+            return snap
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.snapshot.version > version or self.interrupt_flag.is_set(),
+                timeout)
+        snap = self.snapshot
+        return snap if snap.version > version else None
+
+    def request_update(self, names=('status', 'position', 'mode')):
+        "poll these objects right away instead of at their next due time"
+        for name in names:
+            self.poller.request_poll(name)
+        self._wake.set()
+
+    def pause(self):
+        """
+        Stop polling while something else that reads status, mode and
+        position calls publish() with its values, so the controller is not
+        asked twice. Calls nest, each needs a resume()
+        """
+        with self._cond:
+            self._paused += 1
+            self.error = None
+
+    def resume(self):
+        with self._cond:
+            self._paused = max(0, self._paused - 1)
+        self.request_update()
+
+    @property
+    def paused(self):
+        return self._paused > 0
+
+    def publish(self, values, t):
+        "values: name --> value, missing or None: carried over"
+        def get(name, default):
+            value = values.get(name)
+            return default if value is None else value
+        status = values.get('status')
+        # the lock only orders publishers, readers of self.snapshot need none
+        with self._cond:
+            prev = self.snapshot
+            snap = AxisSnapshot(
+                version=prev.version + 1,
+                t=t,
+                position=get('position', prev.position),
+                status=self.d1.decode_status(status) if status is not None else prev.status,
+                mode=get('mode', prev.mode),
+                )
+            self.snapshot = snap
+            self._cond.notify_all()
+        return snap
+
+    def _run(self):
+        # a failed poll (Data Telegram Error, lost connection, ...) must not
+        # end the thread, every consumer would stop getting updates
+        while not self.interrupt_flag.is_set():
+            if self._paused:
+                self._wake.wait(self.poller.max_sleep)
+                self._wake.clear()
+                continue
+            t = time.time()
+            try:
+                values = self.poller.poll()
+            except Exception as err:
+                if self.error is None or repr(err) != repr(self.error):
+                    print(f"StatePublisher poll failed: {err!r}")
+                self.error = err
+                self.errors += 1
+                self.interrupt_flag.wait(self.error_retry)
+                continue
+            self.error = None
+            if values:
+                self.publish(values, t)
+            self._wake.wait(self.poller.time_to_next())
+            self._wake.clear()
@@ -0,0 +1,144 @@
+"""
+Background position/status telemetry for the igus dryve D1.
+
+    rec = TelemetryRecorder(d1, rate=200.0, capacity=100000)
+    rec.start()
+    ...
+    data = rec.snapshot()        # zero-copy view of the last samples
+    rec.export_hdf5("stage_telemetry.h5")
+
+Each sample holds a timestamp (time.time()), actual and target position,
+statusword and mode of operation, read in one pipelined request cycle.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class TelemetryRecorder(object):
+
+    DTYPE = np.dtype([
+        ('t', 'f8'),        # time.time() when the sample was requested
+        ('position', 'i4'), # 6064h Actual Position
+        ('target', 'i4'),   # 607Ah Target Position
+        ('status', 'u2'),   # 6041h Statusword
+        ('mode', 'u1'),     # 6061h Modes of operation display
+        ])
+
+    def __init__(self, d1, rate=100.0, capacity=100000, publisher=None):
+        """
+        d1: connected IgusDryveD1
+        rate: samples per second
+        capacity: number of most recent samples kept
+        publisher: optional StatePublisher (d1.state_publisher()), paused
+            while recording and fed with the samples instead
+        """
+        self.d1 = d1
+        self.publisher = publisher
+        self.rate = rate
+        self.capacity = capacity
+        # mirrored ring buffer: every sample is written at i and i+capacity,
+        # so the last `capacity` samples are always one contiguous slice
+        self._buf = np.zeros(2*capacity, dtype=self.DTYPE)
+        self.count = 0 # total samples recorded
+        self.thread = None
+        self.interrupt_flag = threading.Event()
+        self.error = None
+
+    def start(self):
+        self.interrupt_flag.clear()
+        self.error = None
+        if self.publisher is not None:
+            # resumed when the thread ends
+            self.publisher.pause()
+        self.thread = threading.Thread(target=self._run, name='TelemetryRecorder', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.interrupt_flag.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def clear(self):
+        self.count = 0
+
+    def _run(self):
+        t_next = time.monotonic()
+        try:
+            while not self.interrupt_flag.is_set():
+                self.poll_once()
+                t_next += 1.0/self.rate
+                dt = t_next - time.monotonic()
+                if dt > 0:
+                    self.interrupt_flag.wait(dt)
+                else:
+                    # fell behind, don't try to catch up
+                    t_next = time.monotonic()
+        except Exception as err:
+            self.error = err
+        finally:
+            if self.publisher is not None:
+                self.publisher.resume()
+
+    def poll_once(self):
+        t = time.time()
+        status, mode, pos, target = self.d1.ask_many([
+            dict(sdo_obj=0x6041, sub_index=0, datatype='H'),
+            dict(sdo_obj=0x6061, sub_index=0, datatype='B'),
+            dict(sdo_obj=0x6064, sub_index=0, datatype='i'),
+            dict(sdo_obj=0x607A, sub_index=0, datatype='i'),
+            ])
+        self.append(t, pos, target, status, mode)
+        if self.publisher is not None:
+            self.publisher.publish(dict(status=status, mode=mode, position=pos), t)
+
+    def append(self, t, position, target, status, mode):
+        i = self.count % self.capacity
+        sample = (t, position, target, status, mode)
+        self._buf[i] = sample
+        self._buf[i + self.capacity] = sample
+        self.count += 1
+
+    def latest(self):
+        """most recent sample (numpy record) or None"""
+        if self.count == 0:
+            return None
+        return self._buf[(self.count - 1) % self.capacity]
+
+    def snapshot(self, n=None):
+        """
+        Zero-copy view of the last n samples (default all kept), oldest first.
+        The view is into the live buffer: samples older than `capacity`
+        recordings are overwritten, copy() it to keep it.
+        """
+        available = min(self.count, self.capacity)
+        if n is None or n > available:
+            n = available
+        end = self.count % self.capacity + self.capacity
+        return self._buf[end-n:end]
+
+    def to_arrays(self):
+        "copy of the kept samples as a dict of column arrays"
+        data = self.snapshot()
+        return {name: data[name].copy() for name in self.DTYPE.names}
+
+    def export_npz(self, fname):
+        np.savez_compressed(fname, **self.to_arrays())
+
+    def export_hdf5(self, fname, group='igus_dryve_telemetry'):
+        import h5py
+        with h5py.File(fname, 'a') as h5:
+            if group in h5:
+                del h5[group]
+            g = h5.create_group(group)
+            g.attrs['ip_address'] = self.d1.ip_address
+            g.attrs['rate'] = self.rate
+            for name, arr in self.to_arrays().items():
+                g.create_dataset(name, data=arr, compression='gzip')
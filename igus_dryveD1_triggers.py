@@ -0,0 +1,235 @@
+"""
+Position-triggered callbacks for the igus dryve D1 (fly scans).
+
+    mon = d1.position_monitor()
+    mon.add_threshold(10000, lambda pos, t, direction: print(pos, t, direction))
+    mon.add_window(2000, 3000, lambda window, t, event: print(window, t, event))
+
+One thread per controller polls 6064h Actual Position at a fixed rate and
+checks every subscription against each pair of consecutive samples. The
+crossing time is interpolated linearly between the two samples, each
+sample being stamped (time.time()) halfway between request and response.
+Callbacks run on the monitor thread, so they should return quickly;
+detection latency is at most one poll period plus one round-trip.
+"""
+
+import bisect
+import itertools
+import threading
+import time
+
+
+class PositionSubscription(object):
+
+    __slots__ = ('kind', 'lo', 'hi', 'callback', 'direction', 'once', 'seq', 'inside')
+
+    def __init__(self, kind, lo, hi, callback, direction='both', once=False, seq=0):
+        self.kind = kind # 'threshold' or 'window'
+        self.lo = lo
+        self.hi = hi
+        self.callback = callback
+        self.direction = direction
+        self.once = once
+        self.seq = seq
+        self.inside = None # window: position inside at the last sample
+
+
+class PositionMonitor(object):
+
+    def __init__(self, d1, rate=500.0):
+        """
+        d1: connected IgusDryveD1
+        rate: position samples per second while there are subscriptions
+        """
+        self.d1 = d1
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        # thresholds sorted by position, so a sample pair only looks at the
+        # thresholds between the two positions
+        self._threshold_pos = []
+        self._thresholds = []
+        self._windows = []
+        self._has_subs = threading.Event()
+        self.thread = None
+        self.interrupt_flag = threading.Event()
+        self.error = None
+        self.last_sample = None # (t, position)
+        self.samples = 0
+        self.events = 0
+        self.max_latency = 0.0 # detection time - crossing time (s)
+
+    def start(self):
+        if self.running:
+            return
+        self.interrupt_flag.clear()
+        self.error = None
+        self.last_sample = None
+        self.thread = threading.Thread(target=self._run, name='PositionMonitor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.interrupt_flag.set()
+        self._has_subs.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def add_threshold(self, position, callback, direction='both', once=False):
+        """
+        callback(position, t, direction) when the axis crosses position,
+        direction: 'rising', 'falling' or 'both'. once=True removes the
+        subscription after the first crossing. Returns the subscription
+        (see remove)
+        """
+        assert direction in ('rising', 'falling', 'both')
+        sub = PositionSubscription('threshold', position, position, callback,
+                                   direction, once, next(self._seq))
+        with self._lock:
+            i = bisect.bisect_right(self._threshold_pos, position)
+            self._threshold_pos.insert(i, position)
+            self._thresholds.insert(i, sub)
+        self._subscribed()
+        return sub
+
+    def add_window(self, lo, hi, callback, once=False):
+        """
+        callback((lo, hi), t, 'enter' or 'exit') when the axis enters or
+        leaves lo <= position <= hi. Returns the subscription (see remove)
+        """
+        sub = PositionSubscription('window', min(lo, hi), max(lo, hi), callback,
+                                   once=once, seq=next(self._seq))
+        if self.last_sample is not None:
+            sub.inside = sub.lo <= self.last_sample[1] <= sub.hi
+        with self._lock:
+            self._windows.append(sub)
+        self._subscribed()
+        return sub
+
+    def remove(self, sub):
+        with self._lock:
+            if sub.kind == 'window':
+                if sub in self._windows:
+                    self._windows.remove(sub)
+            elif sub in self._thresholds:
+                i = self._thresholds.index(sub)
+                del self._thresholds[i]
+                del self._threshold_pos[i]
+            if not self._thresholds and not self._windows:
+                self._has_subs.clear()
+
+    def clear(self):
+        with self._lock:
+            self._threshold_pos.clear()
+            self._thresholds.clear()
+            self._windows.clear()
+            self._has_subs.clear()
+
+    def _subscribed(self):
+        self._has_subs.set()
+        self.start()
+
+    def sample(self):
+        "one position reading stamped halfway between request and response"
+        t0 = time.time()
+        pos = self.d1.ask(write=False, sdo_obj=0x6064, sub_index=0, datatype='i')
+        t1 = time.time()
+        return 0.5*(t0 + t1), pos
+
+    def _run(self):
+        try:
+            while not self.interrupt_flag.is_set():
+                if not self._has_subs.is_set():
+                    # nothing to watch, no traffic; the next sample starts fresh
+                    self.last_sample = None
+                    self._has_subs.wait()
+                    continue
+                t_next = time.monotonic() + 1.0/self.rate
+                t, pos = self.sample()
+                self.samples += 1
+                prev = self.last_sample
+                self.last_sample = (t, pos)
+                if prev is not None and prev[1] != pos:
+                    self.check(prev, (t, pos))
+                else:
+                    self._init_windows(pos)
+                dt = t_next - time.monotonic()
+                if dt > 0:
+                    self.interrupt_flag.wait(dt)
+        except Exception as err:
+            self.error = err
+
+    def _init_windows(self, pos):
+        with self._lock:
+            for sub in self._windows:
+                if sub.inside is None:
+                    sub.inside = sub.lo <= pos <= sub.hi
+
+    @staticmethod
+    def _crossing_time(s0, s1, x):
+        (t0, p0), (t1, p1) = s0, s1
+        return t0 + (x - p0)/(p1 - p0)*(t1 - t0)
+
+    def check(self, s0, s1):
+        """
+        Fire the subscriptions crossed between samples s0 and s1, both
+        (t, position), in order of crossing time
+        """
+        p0, p1 = s0[1], s1[1]
+        fired = [] # (t, seq, sub, args)
+        with self._lock:
+            if p1 > p0:
+                # p0 < x <= p1
+                i0 = bisect.bisect_right(self._threshold_pos, p0)
+                i1 = bisect.bisect_right(self._threshold_pos, p1)
+                direction = 'rising'
+            else:
+                # p1 <= x < p0
+                i0 = bisect.bisect_left(self._threshold_pos, p1)
+                i1 = bisect.bisect_left(self._threshold_pos, p0)
+                direction = 'falling'
+            for sub in self._thresholds[i0:i1]:
+                if sub.direction in ('both', direction):
+                    t = self._crossing_time(s0, s1, sub.lo)
+                    fired.append((t, sub.seq, sub, (sub.lo, t, direction)))
+            for sub in self._windows:
+                inside = sub.lo <= p1 <= sub.hi
+                if sub.inside is None:
+                    sub.inside = sub.lo <= p0 <= sub.hi
+                if inside == sub.inside:
+                    if not inside and min(p0, p1) < sub.lo and max(p0, p1) > sub.hi:
+                        # passed through the whole window between two samples
+                        first, last = (sub.lo, sub.hi) if p1 > p0 else (sub.hi, sub.lo)
+                        for edge, event in ((first, 'enter'), (last, 'exit')):
+                            t = self._crossing_time(s0, s1, edge)
+                            fired.append((t, sub.seq, sub, ((sub.lo, sub.hi), t, event)))
+                    continue
+                sub.inside = inside
+                if inside:
+                    edge = sub.lo if p1 > p0 else sub.hi
+                else:
+                    edge = sub.hi if p1 > p0 else sub.lo
+                t = self._crossing_time(s0, s1, edge)
+                fired.append((t, sub.seq, sub, ((sub.lo, sub.hi), t, 'enter' if inside else 'exit')))
+        fired.sort(key=lambda f: (f[0], f[1]))
+        now = time.time()
+        done = set()
+        for t, seq, sub, args in fired:
+            if sub.once:
+                if seq in done:
+                    continue
+                done.add(seq)
+                self.remove(sub)
+            self.events += 1
+            if now - t > self.max_latency:
+                self.max_latency = now - t
+            sub.callback(*args)
+
+    def get_stats(self):
+        return dict(samples=self.samples, events=self.events, rate=self.rate,
+                    max_latency=self.max_latency,
+                    subscriptions=len(self._thresholds) + len(self._windows))
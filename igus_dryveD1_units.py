@@ -0,0 +1,129 @@
+"""
+Physical units for the igus dryve D1.
+
+The controller works in integer position units: feed_constant (6092h sub 1)
+position units per feed_revs (6092h sub 2) motor revolutions. With the
+mechanical lead of the axis (physical units, eg um, per motor revolution)
+one position unit is
+
+    scale = lead * feed_revs / feed_constant
+
+physical units, and velocities (/s) and accelerations (/s2) scale the same
+way. Without a lead the position units are taken to be the physical units
+(scale 1).
+
+    units = DryveUnits(d1, lead=5000.0, soft_limits=(0, 300000))
+    raw_points = units.positions_to_raw(np.linspace(0, 1000, 101))
+
+Feed constant and revolutions come from the driver's od_cache, which holds
+them after any read or write, so conversions cost no SDO requests.
+Scalars, lists and numpy arrays are accepted everywhere.
+"""
+
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+UINT32_MAX = 2**32 - 1
+
+
+class DryveUnits(object):
+
+    def __init__(self, d1, lead=None, soft_limits=(None, None)):
+        """
+        d1: connected IgusDryveD1
+        lead: physical units per motor revolution, None: scale 1
+        soft_limits: (min, max) allowed target positions in physical units,
+            None for no limit
+        """
+        self.d1 = d1
+        self.lead = lead
+        self.soft_limits = soft_limits
+
+    def feed(self):
+        "(feed_constant, feed_revs), read from the controller only if not cached"
+        cache = self.d1.od_cache
+        fc = cache.get((0x6092, 1))
+        revs = cache.get((0x6092, 2))
+        if fc is None or revs is None:
+            fc, revs = self.d1.ask_many([
+                dict(sdo_obj=0x6092, sub_index=1, datatype='I'),
+                dict(sdo_obj=0x6092, sub_index=2, datatype='I'),
+                ])
+        return fc, revs
+
+    @property
+    def scale(self):
+        "physical units per position unit"
+        if not self.lead:
+            return 1.0
+        fc, revs = self.feed()
+        return self.lead * revs / fc
+
+    def from_raw(self, raw):
+        "position units (/s, /s2) --> physical units, float"
+        scale = self.scale
+        if hasattr(raw, 'dtype'):
+            return raw * scale
+        if isinstance(raw, (list, tuple)):
+            return [x*scale for x in raw]
+        return raw * scale
+
+    def to_raw(self, x):
+        "physical units --> position units, rounded to int (numpy: int64 array)"
+        scale = self.scale
+        if hasattr(x, 'dtype'):
+            import numpy as np
+            return np.rint(x / scale).astype(np.int64)
+        if isinstance(x, (list, tuple)):
+            return [int(round(v/scale)) for v in x]
+        return int(round(x/scale))
+
+    def check_positions(self, x):
+        """
+        Raise ValueError if any of the positions x (physical units) is
+        outside the soft limits
+        """
+        lo, hi = self.soft_limits
+        if lo is None and hi is None:
+            return
+        if hasattr(x, 'dtype') or isinstance(x, (list, tuple)):
+            import numpy as np
+            x = np.asarray(x)
+            if x.size == 0:
+                return
+            xmin, xmax = x.min(), x.max()
+        else:
+            xmin = xmax = x
+        if lo is not None and xmin < lo:
+            raise ValueError(f"position {xmin} below soft limit {lo}")
+        if hi is not None and xmax > hi:
+            raise ValueError(f"position {xmax} above soft limit {hi}")
+
+    @staticmethod
+    def _check_range(raw, lo, hi, what):
+        if hasattr(raw, 'dtype') or isinstance(raw, list):
+            import numpy as np
+            arr = np.asarray(raw)
+            if arr.size == 0:
+                return
+            rmin, rmax = arr.min(), arr.max()
+        else:
+            rmin = rmax = raw
+        if rmin < lo or rmax > hi:
+            raise ValueError(f"{what} out of range for the controller: {rmin}..{rmax}")
+
+    def position_to_raw(self, x):
+        "checked against the soft limits and the 607Ah range"
+        self.check_positions(x)
+        raw = self.to_raw(x)
+        self._check_range(raw, INT32_MIN, INT32_MAX, "position")
+        return raw
+
+    # batch of scan points, same checks
+    positions_to_raw = position_to_raw
+
+    def velocity_to_raw(self, v):
+        "velocity or acceleration, checked against the 6081h / 6083h range"
+        raw = self.to_raw(v)
+        self._check_range(raw, 0, UINT32_MAX, "velocity/acceleration")
+        return raw
+
+    acc_to_raw = velocity_to_raw
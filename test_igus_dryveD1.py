@@ -0,0 +1,174 @@
+"""
+Driver regression tests against the simulated dryve D1 (igus_dryveD1_sim).
+
+    python -m pytest -q test_igus_dryveD1.py
+"""
+
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from ScopeFoundryHW.igus_dryve.igus_dryveD1 import IgusDryveD1, DryveD1SDOError
+from ScopeFoundryHW.igus_dryve.igus_dryveD1_sim import DryveD1SimServer, SimulatedDryveD1
+from ScopeFoundryHW.igus_dryve.igus_dryveD1_motion import AxisWorker
+from ScopeFoundryHW.igus_dryve.igus_dryveD1_capture import open_replay
+
+
+def start_sim(**kwargs):
+    sim = DryveD1SimServer(**kwargs)
+    port = sim.start_in_thread()
+    return sim, port
+
+
+@pytest.fixture
+def sim():
+    sim, port = start_sim(latency=0.0002)
+    yield sim
+    sim.stop()
+
+
+@pytest.fixture
+def d1(sim):
+    d1 = IgusDryveD1('127.0.0.1', sim.port)
+    yield d1
+    d1.close()
+
+
+def test_split_responses():
+    sim, port = start_sim(split_responses=True)
+    d1 = None
+    try:
+        d1 = IgusDryveD1('127.0.0.1', port)
+        sim.axis.position = 1234
+        for i in range(20):
+            status, mode, pos = d1.read_status_mode_position()
+            assert status.oe and pos == 1234
+        stats = d1.get_rx_stats()
+        # every frame came byte by byte, each counted once
+        assert stats['resyncs'] == 0
+        assert 0 < stats['partial_reads'] <= stats['frames']
+    finally:
+        if d1 is not None:
+            d1.close()
+        sim.stop()
+
+
+def test_pipelined_batch(d1):
+    d1.write_many(dict(profile_velocity=1111, profile_acc=2222))
+    assert d1.read_many(['profile_velocity', 'profile_acc', 'actual_position']) == dict(
+        profile_velocity=1111, profile_acc=2222, actual_position=0)
+
+
+def test_cache_skips_unchanged_writes(sim, d1):
+    d1.write_profile_velocity(1234)
+    requests, skips = sim.axis.requests, d1.cache_skips
+    d1.write_profile_velocity(1234)
+    assert sim.axis.requests == requests
+    assert d1.cache_skips == skips + 1
+    d1.write_profile_velocity(1235)
+    assert sim.axis.requests == requests + 1
+    assert sim.axis.od[(0x6081, 0)] == 1235
+
+
+def test_reconnect_after_link_drop(sim, d1):
+    d1.write_profile_velocity(1234)
+    sim.drop_connections()
+    time.sleep(0.05)
+    assert d1.read_status().oe
+    assert d1.reconnects == 1
+    # controller kept its values, nothing to write back
+    assert d1.restored_writes == 0
+
+
+def test_reconnect_restores_power_cycled_controller(sim, d1):
+    d1.write_profile_velocity(1234)
+    d1.write_profile_acc(999)
+    d1.write_mode_and_wait(1)
+    sim.axis = SimulatedDryveD1()
+    sim.drop_connections()
+    time.sleep(0.05)
+    assert d1.read_status().oe
+    assert d1.reconnects == 1
+    assert sim.axis.od[(0x6081, 0)] == 1234
+    assert sim.axis.od[(0x6083, 0)] == 999
+    assert d1.read_mode() == 1
+
+
+def test_sdo_error_raises(sim, d1):
+    sim.axis.fail_next(1)
+    with pytest.raises(DryveD1SDOError):
+        d1.read_status()
+    assert d1.read_status().oe
+
+
+def test_state_publisher_survives_sdo_error(sim, d1):
+    pub = d1.state_publisher()
+    snap = pub.wait_newer(0, timeout=1.0)
+    sim.axis.fail_next(1)
+    pub.request_update()
+    snap = pub.wait_newer(snap.version, timeout=2.0)
+    assert snap is not None and pub.running
+
+
+def test_capture_replay(d1, tmp_path):
+    fname = str(tmp_path / 'move.dcap')
+    d1.start_capture(fname)
+    d1.go_abs_pos_and_wait(2000, 50000, 500000)
+    position = d1.read_actual_position()
+    d1.stop_capture()
+    replay = open_replay(fname)
+    replay.go_abs_pos_and_wait(2000, 50000, 500000)
+    assert replay.read_actual_position() == position == 2000
+    assert replay.s.unmatched == 0
+    replay.close()
+
+
+def test_move_future(d1):
+    worker = AxisWorker(d1)
+    try:
+        fut = worker.move_to(1000, 50000, 500000)
+        assert fut.result(timeout=5)['tr']
+        assert d1.read_actual_position() == 1000
+    finally:
+        worker.shutdown()
+
+
+def test_cancel_running_move(sim, d1):
+    worker = AxisWorker(d1)
+    try:
+        fut = worker.move_to(50000, 5000, 20000)
+        time.sleep(0.2)
+        assert fut.running()
+        fut.cancel()
+        with pytest.raises(CancelledError):
+            fut.result(timeout=5)
+        assert sim.axis.move is None
+        pos = sim.axis.position
+        time.sleep(0.05)
+        assert 0 < sim.axis.position == pos < 50000
+    finally:
+        worker.shutdown()
+
+
+@pytest.mark.parametrize('delay', [0.0, 0.01, 0.03])
+def test_cancel_during_setup(delay):
+    # cancel while setup_abs_move is still talking to the controller
+    sim, port = start_sim(latency=0.01)
+    d1 = worker = None
+    try:
+        d1 = IgusDryveD1('127.0.0.1', port)
+        worker = AxisWorker(d1)
+        fut = worker.move_to(50000, 5000, 20000)
+        time.sleep(delay)
+        fut.cancel()
+        with pytest.raises(CancelledError):
+            fut.result(timeout=5)
+        time.sleep(0.05)
+        assert sim.axis.move is None
+    finally:
+        if worker is not None:
+            worker.shutdown()
+        if d1 is not None:
+            d1.close()
+        sim.stop()